@@ -1,54 +1,105 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-import subprocess
-import os
-import signal
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, make_response
 import csv
+import os
+import threading
+from datetime import datetime, timedelta
+import mysql.connector
+from config import BASE_URL, DEVICE_IDS
+from auth import TokenManager
+from client import HeyHomeClient
+from status_cache import StatusCache, port_states
+from events import EventBroker
+from supervisor import Supervisor
+from database import PORT_COLUMNS
+from export import CONTENT_TYPES, export
+from metrics import CONTENT_TYPE, REGISTRY
+from rollup import duty_cycle
+from schedule import compile_schedule
+from utility import load_step_table, parse_steps, read_step_rows
 
 app = Flask(__name__)
 
 STEPS_FILE = "steps.csv"
-heyhome_process = None  # 전역 변수로 프로세스 상태 관리
+supervisor = Supervisor()  # heyhome.py 프로세스 실행/재시작/종료 관리
+status_cache = None  # 장치 상태 캐시 (처음 조회할 때 생성)
+_status_cache_lock = threading.Lock()
+event_broker = EventBroker()  # 컨트롤러 이벤트를 받아 SSE 클라이언트에 전달
+_compiled = [None, None]  # [steps.csv etag, 컴파일된 일정]
+
+
+def get_status_cache():
+    """Return the shared device status cache, creating its API client on first use."""
+    global status_cache
+    with _status_cache_lock:
+        if status_cache is None:
+            client = HeyHomeClient(BASE_URL)
+            client.token_provider = TokenManager(client)
+            status_cache = StatusCache(client)
+        return status_cache
 
 
-# CSV 파일에서 데이터 로드
-def load_steps():
-    steps = []
-    if os.path.exists(STEPS_FILE):
-        with open(STEPS_FILE, mode="r") as file:
-            reader = csv.DictReader(file)
-            steps = [row for row in reader]
-    return steps
+# 클라이언트 캐시가 최신이면 템플릿을 렌더링하지 않고 304로 응답
+def render_cached(etag, last_modified, template, **context):
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since
+                            and request.if_modified_since >= last_modified.replace(microsecond=0))
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = make_response(render_template(template, **context))
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
 
 
-# CSV 파일에 데이터 저장
+# CSV 파일에 데이터 저장 (임시 파일에 다 쓴 뒤 교체하므로 컨트롤러가 반쯤 쓴 파일을 읽지 않음)
 def save_steps(steps):
-    with open(STEPS_FILE, mode="w", newline="") as file:
-        fieldnames = ["description", "power1", "power2", "power3", "duration"]
+    temp_file = f"{STEPS_FILE}.tmp"
+    with open(temp_file, mode="w", newline="") as file:
+        fieldnames = ["description", "power1", "power2", "power3", "duration", "cycle"]
         writer = csv.DictWriter(file, fieldnames=fieldnames)
         writer.writeheader()
         writer.writerows(steps)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, STEPS_FILE)
+
+
+# 검증되지 않은 행을 편집 화면에 그대로 보여 주기 위한 형태로 변환
+def display_rows(rows):
+    return [
+        {
+            "description": row.get("description") or "",
+            "states": {port: (row.get(port) or "").strip().lower() == "true"
+                       for port in ("power1", "power2", "power3")},
+            "duration": row.get("duration") or "",
+            "cycle": row.get("cycle") or "",
+        }
+        for row in rows
+    ]
 
 
 @app.route('/')
 def index():
-    steps = load_steps()
-    status = "Running" if heyhome_process else "Stopped"
-    return render_template('index.html', status=status, steps=steps)
+    table = load_step_table(STEPS_FILE)
+    status = ("Paused" if supervisor.paused else "Running") if supervisor.running else "Stopped"
+    return render_cached(f"{table.etag}-{status}", table.last_modified,
+                         'index.html', status=status, steps=table.steps)
 
 
 @app.route('/start', methods=['POST'])
 def start_heyhome():
-    global heyhome_process
-    if heyhome_process:
+    if supervisor.running:
         return jsonify({"message": "HeyHome is already running."}), 400
 
-    # heyhome.py 실행
+    # heyhome.py 실행 (이벤트를 놓치지 않도록 수신 소켓을 먼저 연다)
     try:
-        heyhome_process = subprocess.Popen(
-            ["python3", "heyhome.py"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
+        event_broker.start()
+        supervisor.start()
         return jsonify({"message": "HeyHome started successfully."}), 200
     except Exception as e:
         return jsonify({"message": f"Failed to start HeyHome: {str(e)}"}), 500
@@ -56,37 +107,170 @@ def start_heyhome():
 
 @app.route('/stop', methods=['POST'])
 def stop_heyhome():
-    global heyhome_process
-    if not heyhome_process:
-        return jsonify({"message": "HeyHome is not running."}), 400
-
-    # heyhome.py 프로세스 종료
+    # heyhome.py 정상 종료 (남은 DB 기록 저장 후 종료, 제한 시간 초과 시 강제 종료)
+    # 크래시 후 재시작을 기다리는 중이면 재시작을 취소
     try:
-        os.kill(heyhome_process.pid, signal.SIGTERM)
-        heyhome_process = None
+        if not supervisor.stop():
+            return jsonify({"message": "HeyHome is not running."}), 400
         return jsonify({"message": "HeyHome stopped successfully."}), 200
     except Exception as e:
         return jsonify({"message": f"Failed to stop HeyHome: {str(e)}"}), 500
 
 
+@app.route('/pause', methods=['POST'])
+def pause_heyhome():
+    if not supervisor.pause():
+        return jsonify({"message": "HeyHome is not running or already paused."}), 400
+    return jsonify({"message": "HeyHome paused."}), 200
+
+
+@app.route('/resume', methods=['POST'])
+def resume_heyhome():
+    if not supervisor.resume():
+        return jsonify({"message": "HeyHome is not paused."}), 400
+    return jsonify({"message": "HeyHome resumed."}), 200
+
+
+@app.route('/controller')
+def controller_status():
+    return jsonify(supervisor.status())
+
+
+@app.route('/status')
+def device_status():
+    # 캐시된 상태를 돌려주고, TTL이 지난 장치만 API에서 다시 조회
+    device_ids = request.args.getlist('device_id') or DEVICE_IDS
+    statuses = get_status_cache().get_many(device_ids)
+    return jsonify({
+        device_id: {"ports": port_states(status), "status": status}
+        for device_id, status in statuses.items()
+    })
+
+
+@app.route('/schedule')
+def schedule_state():
+    # t초 시점 (또는 device_id의 at 시각)에 장치가 있어야 할 단계 (컴파일된 일정은 steps.csv가 바뀔 때만 다시 만듦)
+    table = load_step_table(STEPS_FILE)
+    if _compiled[0] != table.etag:
+        _compiled[:] = [table.etag, compile_schedule(table.steps)]
+    schedule = _compiled[1]
+    if schedule.period <= 0:
+        return jsonify({"message": "No runnable cycles."}), 404
+    device_id = request.args.get('device_id')
+    if not device_id:
+        elapsed = request.args.get('t', 0, type=float)
+        return jsonify({"period": schedule.period, "elapsed": elapsed, **schedule.state_at(elapsed)})
+
+    # 컨트롤러가 단계 이벤트로 보낸 장치별 일정 시작 시각 기준으로 계산
+    event_broker.start()
+    event = event_broker.last(device_id)
+    if not event or not event.get("anchor"):
+        return jsonify({"message": f"No schedule information from the controller for {device_id}."}), 404
+    try:
+        at = datetime.fromisoformat(request.args['at']) if 'at' in request.args else datetime.now()
+        if at.tzinfo:
+            at = at.astimezone().replace(tzinfo=None)  # 컨트롤러 시각은 로컬 시간
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    anchor = datetime.fromisoformat(event["anchor"])
+    elapsed = (at - anchor).total_seconds()
+    return jsonify({"device_id": device_id, "at": at.isoformat(), "anchor": event["anchor"],
+                    "period": schedule.period, "elapsed": elapsed, **schedule.state_at(elapsed)})
+
+
+@app.route('/metrics')
+def metrics():
+    # 대시보드 프로세스의 지표 (API 호출 등), 컨트롤러 지표는 METRICS_PORT에서 제공
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@app.route('/duty-cycle')
+def duty_cycle_report():
+    # 집계 테이블만 조회하므로 원본 power_status를 훑지 않음
+    try:
+        end = datetime.fromisoformat(request.args['end']) if 'end' in request.args else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if 'start' in request.args else end - timedelta(days=7)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid start/end: {e}"}), 400
+    resolution = request.args.get('resolution', 'day')
+    ports = request.args.getlist('port')
+    if resolution not in ('day', 'hour') or any(port not in PORT_COLUMNS for port in ports):
+        return jsonify({"message": "resolution must be day or hour, port one of " + ", ".join(PORT_COLUMNS)}), 400
+    try:
+        rows = duty_cycle(start, end, request.args.getlist('device_id'), ports, resolution)
+    except mysql.connector.Error as e:
+        return jsonify({"message": f"Database unavailable: {e}"}), 503
+    return jsonify({"start": start.isoformat(), "end": end.isoformat(), "resolution": resolution, "rows": rows})
+
+
+@app.route('/export')
+def export_history():
+    # 기간 내 기록을 읽는 즉시 조금씩 전송 (웹 프로세스 메모리는 기록 양과 무관)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in CONTENT_TYPES:
+        return jsonify({"message": "format must be one of " + ", ".join(CONTENT_TYPES)}), 400
+    try:
+        end = datetime.fromisoformat(request.args['end']) if 'end' in request.args else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if 'start' in request.args else end - timedelta(days=1)
+        stream = export(start, end, request.args.getlist('device_id'), fmt)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except mysql.connector.Error as e:
+        return jsonify({"message": f"Database unavailable: {e}"}), 503
+    filename = f"power_status_{start:%Y%m%d%H%M}_{end:%Y%m%d%H%M}.{fmt}"
+    return Response(stream, content_type=CONTENT_TYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Accel-Buffering': 'no'})
+
+
+@app.route('/events')
+def events():
+    # 컨트롤러의 단계 이벤트를 Server-Sent Events로 스트리밍
+    event_broker.start()
+    return Response(event_broker.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/edit', methods=['GET', 'POST'])
 def edit_steps():
-    steps = load_steps()
     if request.method == 'POST':
-        # 업데이트된 데이터를 CSV에 저장
+        # 폼에 있는 행을 모두 읽고, 컨트롤러와 같은 검증을 통과한 경우에만 CSV에 저장
         updated_steps = []
-        for i in range(len(steps)):
+        i = 0
+        while f"description_{i}" in request.form:
             updated_steps.append({
                 "description": request.form[f"description_{i}"],
-                "power1": request.form[f"power1_{i}"],
-                "power2": request.form[f"power2_{i}"],
-                "power3": request.form[f"power3_{i}"],
-                "duration": request.form[f"duration_{i}"]
+                "power1": request.form.get(f"power1_{i}", ""),
+                "power2": request.form.get(f"power2_{i}", ""),
+                "power3": request.form.get(f"power3_{i}", ""),
+                "duration": request.form.get(f"duration_{i}", ""),
+                "cycle": request.form.get(f"cycle_{i}", "")
             })
+            i += 1
+        try:
+            if not updated_steps:
+                raise ValueError("at least one step is required")
+            parse_steps(updated_steps)
+        except ValueError as e:
+            return render_template('edit.html', steps=display_rows(updated_steps), error=str(e)), 400
         save_steps(updated_steps)
+        # 실행 중인 컨트롤러는 다음 사이클 경계에서 새 단계를 적용
+        supervisor.reload()
         return redirect(url_for('index'))
-    return render_template('edit.html', steps=steps)
+    table = load_step_table(STEPS_FILE)
+    if table.steps or table.etag == "missing":
+        return render_cached(table.etag, table.last_modified, 'edit.html', steps=table.steps)
+    # 파일이 잘못되어 단계가 없으면 원래 행을 그대로 보여 주고 고칠 수 있게 함
+    rows = []
+    try:
+        rows = read_step_rows(STEPS_FILE)
+        parse_steps(rows)
+        error = None
+    except (OSError, csv.Error, ValueError) as e:
+        error = f"{STEPS_FILE} is invalid, fix it and save: {e}"
+    return render_template('edit.html', steps=display_rows(rows) if error else [], error=error)
 
 
 if __name__ == '__main__':
+    supervisor.serve()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -2,11 +2,15 @@ import os
 import requests
 import json
 import base64
+import tempfile
+import threading
+import time
 from datetime import datetime, timedelta
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
-from dotenv import set_key
-from config import BASE_URL, LOG_FILE
+from config import BASE_URL, LOG_FILE, ENV_FILE, TOKEN_REFRESH_MARGIN
+from client import HeyHomeClient
+from metrics import TOKEN_REFRESHES
 import logging
 
 # AES256 암호화 클래스
@@ -32,12 +36,13 @@ def is_token_expired(issued_at, expires_in):
     expires_at = issued_at + timedelta(seconds=int(expires_in))
     return datetime.now() >= expires_at
 
-def fetch_token(app_key, credentials):
+def fetch_token(app_key, credentials, client=None):
     """Fetch a new token from the API."""
     aes = AES256(app_key)
     encrypted_data = aes.encrypt(json.dumps(credentials))
+    client = client or HeyHomeClient(BASE_URL)
     try:
-        response = requests.post(f"{BASE_URL}/token", json={"data": encrypted_data})
+        response = client.token(encrypted_data)
         response.raise_for_status()
         token_data = response.json()
         token_data["issued_at"] = datetime.now()
@@ -46,41 +51,161 @@ def fetch_token(app_key, credentials):
         logging.error(f"Error fetching token: {e}")
         return None
 
-def save_token_to_env(token_data):
-    """Save token data to .env."""
+def save_token_to_env(token_data, env_file=ENV_FILE):
+    """Save all token fields to .env in a single atomic write."""
+    values = {
+        key.upper(): value.isoformat(timespec="seconds") if isinstance(value, datetime) else str(value)
+        for key, value in token_data.items()
+    }
     try:
-        for key, value in token_data.items():
-            set_key('.env', key.upper(), str(value))
+        lines = []
+        if os.path.exists(env_file):
+            with open(env_file, "r") as file:
+                lines = file.read().splitlines()
+        # 기존 키는 그 자리에서 교체하고, 없는 키는 파일 끝에 추가
+        for i, line in enumerate(lines):
+            key = line.split("=", 1)[0].strip()
+            if "=" in line and key in values:
+                lines[i] = f"{key}={values.pop(key)}"
+        lines.extend(f"{key}={value}" for key, value in values.items())
+
+        # 임시 파일에 쓴 뒤 교체해 중간에 끊겨도 .env가 깨지지 않게 함
+        directory = os.path.dirname(os.path.abspath(env_file))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".env.")
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, env_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
         logging.info("Token data updated in .env")
     except Exception as e:
         logging.error(f"Error saving token to .env: {e}")
 
+def parse_issued_at(value):
+    """Parse ISSUED_AT from .env, accepting both 'T' and space separators."""
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+class TokenManager:
+    """Hold the access token in memory and refresh it in the background before it expires."""
+
+    def __init__(self, client=None, env_file=ENV_FILE, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.client = client or HeyHomeClient(BASE_URL)
+        self.env_file = env_file
+        self.refresh_margin = refresh_margin
+        self.refresh_count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._token = {}
+        self._expires_at = 0.0
+        self._load_from_env()
+
+    def _load_from_env(self):
+        issued_at = parse_issued_at(os.getenv("ISSUED_AT"))
+        expires_in = os.getenv("EXPIRES_IN")
+        self._set_token({
+            "access_token": os.getenv("ACCESS_TOKEN"),
+            "token_type": os.getenv("TOKEN_TYPE"),
+            "refresh_token": os.getenv("REFRESH_TOKEN"),
+            "expires_in": int(expires_in) if expires_in and expires_in.isdigit() else 0,
+            "scope": os.getenv("SCOPE"),
+            "issued_at": issued_at,
+        })
+
+    def _set_token(self, token_data):
+        issued_at = token_data.get("issued_at")
+        self._token = token_data
+        # 만료 시각은 epoch 초로 한 번만 계산해 두고 이후에는 비교만 함
+        if token_data.get("access_token") and issued_at:
+            self._expires_at = issued_at.timestamp() + int(token_data.get("expires_in") or 0)
+        else:
+            self._expires_at = 0.0
+
+    @property
+    def refresh_at(self):
+        lifetime = int(self._token.get("expires_in") or 0)
+        return self._expires_at - min(self.refresh_margin, lifetime / 2)
+
+    def get_token(self):
+        """Return a valid access token, refreshing it first if it has expired."""
+        if time.time() < self._expires_at:
+            return self._token["access_token"]
+        return self.refresh()
+
+    def refresh(self, stale_token=None):
+        """Fetch a new token, preferring the refresh_token grant; returns the access token."""
+        with self._lock:
+            current = self._token.get("access_token")
+            # 다른 스레드가 이미 갱신했다면 다시 요청하지 않음
+            if stale_token and current and current != stale_token:
+                return current
+            if not stale_token and current and time.time() < self.refresh_at:
+                return current
+
+            token_data = None
+            if self._token.get("refresh_token"):
+                token_data = self._fetch("refresh_token", refresh_token=self._token["refresh_token"])
+            if not token_data:
+                token_data = self._fetch("password", username=os.getenv("USERNAME"), password=os.getenv("PASSWORD"))
+            if not token_data:
+                return current if time.time() < self._expires_at else None
+
+            if not token_data.get("refresh_token"):
+                token_data["refresh_token"] = self._token.get("refresh_token")
+            self._set_token(token_data)
+            self.refresh_count += 1
+            save_token_to_env(token_data, self.env_file)
+            logging.info(f"Access token refreshed, expires at {datetime.fromtimestamp(self._expires_at):%Y-%m-%d %H:%M:%S}")
+            return token_data["access_token"]
+
+    def _fetch(self, grant_type, **grant):
+        credentials = {
+            "client_id": os.getenv("CLIENT_ID"),
+            "client_secret": os.getenv("CLIENT_SECRET"),
+            "grant_type": grant_type,
+            **grant,
+        }
+        logging.info(f"Requesting token with {grant_type} grant.")
+        token_data = fetch_token(os.getenv("APP_KEY"), credentials, self.client)
+        TOKEN_REFRESHES.inc(grant=grant_type, result="success" if token_data else "failure")
+        return token_data
+
+    def start(self):
+        """Start the background refresh thread."""
+        if not self._thread:
+            self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        retry_delay = 60
+        while not self._stop.is_set():
+            delay = self.refresh_at - time.time()
+            if delay > 0:
+                # 긴 대기도 stop()에 바로 반응하도록 Event로 기다림
+                self._stop.wait(min(delay, 3600))
+                continue
+            refresh_count = self.refresh_count
+            self.refresh()
+            if self.refresh_count > refresh_count:
+                retry_delay = 60
+            else:
+                logging.error(f"Background token refresh failed, retrying in {retry_delay}s.")
+                self._stop.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, 3600)
+
 def get_valid_token():
     """Ensure a valid token is available and return it."""
-    access_token = os.getenv("ACCESS_TOKEN")
-    if access_token:
-        issued_at_str = os.getenv("ISSUED_AT")
-        expires_in = os.getenv("EXPIRES_IN")
-        
-        if issued_at_str and expires_in:
-            # ISO 8601 형식의 ISSUED_AT 처리
-            issued_at = datetime.strptime(issued_at_str, "%Y-%m-%dT%H:%M:%S")
-            if not is_token_expired(issued_at, int(expires_in)):
-                logging.info("Using valid token from .env")
-                return access_token
-
-    logging.info("Token expired or unavailable. Fetching new one.")
-    credentials = {
-        "client_id": os.getenv("CLIENT_ID"),
-        "client_secret": os.getenv("CLIENT_SECRET"),
-        "grant_type": "password",
-        "username": os.getenv("USERNAME"),
-        "password": os.getenv("PASSWORD")
-    }
-    app_key = os.getenv("APP_KEY")
-    token_data = fetch_token(app_key, credentials)
-    if token_data:
-        save_token_to_env(token_data)
-        return token_data["access_token"]
-    return None
+    return TokenManager().get_token()
 
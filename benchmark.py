@@ -0,0 +1,325 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import database
+from auth import TokenManager
+from client import HeyHomeClient
+from engine import CycleEngine
+from journal import Journal, JournalWriter
+from mock_server import MockHeyHome, MockServer
+from schedule import compile_schedule
+from scheduler import MonotonicClock
+from simulation import FakeClient, RecordingWriter
+from utility import load_step_table, load_steps_from_csv
+
+# 모의 서버의 토큰 교환에 쓰는 기본 키 (.env에 APP_KEY가 없을 때)
+os.environ.setdefault("APP_KEY", "0" * 32)
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def latency_summary(samples):
+    """Latency percentiles in milliseconds."""
+    return {
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "max_ms": round(max(samples, default=0.0) * 1000, 3),
+    }
+
+@contextmanager
+def mock_api(**options):
+    api = MockHeyHome(**options)
+    server = MockServer(api).start()
+    try:
+        yield api, server
+    finally:
+        server.stop()
+
+def bench_control(calls=2000, workers=32, devices=1000, latency=0.0):
+    """Control calls per second through HeyHomeClient against the local mock server."""
+    with mock_api(devices=devices, latency=latency) as (api, server):
+        client = HeyHomeClient(server.url, api.issue_token(), pool_size=workers)
+        device_ids = list(api.devices)
+        body = b'{"requirments": {"power1": true, "power2": false, "power3": true}}'
+
+        def call(i):
+            start = time.perf_counter()
+            status = client.control(device_ids[i % len(device_ids)], None, body).status_code
+            return time.perf_counter() - start, status
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(call, range(min(workers, calls))))  # 연결 풀 예열
+            start = time.perf_counter()
+            results = list(executor.map(call, range(calls)))
+            elapsed = time.perf_counter() - start
+        client.close()
+    return {
+        "calls": calls,
+        "workers": workers,
+        "calls_per_s": round(calls / elapsed, 1),
+        "errors": sum(1 for _, status in results if status != 200),
+        **latency_summary([latency for latency, _ in results]),
+    }
+
+def bench_jitter(devices=200, step=0.05, runtime=2.0):
+    """Step deadline lateness of the real engine with many devices and short steps."""
+    steps = [
+        {"description": "on", "duration": step, "cycle": 1,
+         "states": {"power1": True, "power2": False, "power3": True}},
+        {"description": "off", "duration": step, "cycle": 1,
+         "states": {"power1": False, "power2": False, "power3": True}},
+    ]
+    clock = MonotonicClock()
+    writer = RecordingWriter()
+    engine = CycleEngine(steps, FakeClient(clock), writer, runtime, clock=clock)
+    latenesses = []
+    record = engine.jitter.record
+
+    def capture(lateness):
+        latenesses.append(max(0.0, lateness))
+        record(lateness)
+
+    engine.jitter.record = capture
+    asyncio.run(engine.run([f"jitter-{i}" for i in range(devices)]))
+    return {"devices": devices, "step_s": step, "steps": len(latenesses), **latency_summary(latenesses)}
+
+class SQLiteStandIn:
+    """Stand-in for a pooled MySQL connection backed by one in-memory SQLite database."""
+
+    def __init__(self):
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE devices (id INTEGER PRIMARY KEY AUTOINCREMENT, device_id TEXT UNIQUE);
+            CREATE TABLE step_descriptions (id INTEGER PRIMARY KEY AUTOINCREMENT, description TEXT UNIQUE);
+            CREATE TABLE power_status (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, cycle_id INT, timestamp TEXT, device_key INT,
+                fog BOOLEAN, plasma BOOLEAN, pump BOOLEAN, description_key INT
+            );
+            CREATE INDEX idx_device_time ON power_status (device_key, timestamp);
+        """)
+        # database.py가 공유 조회 키 캐시를 쓰므로 새 DB마다 비움
+        database.DEVICE_KEYS._keys.clear()
+        database.DESCRIPTION_KEYS._keys.clear()
+        self._result = None
+
+    def connect(self):
+        return self
+
+    def cursor(self, **kwargs):
+        return self
+
+    @staticmethod
+    def _sql(sql):
+        return sql.replace("%s", "?").replace("INSERT IGNORE", "INSERT OR IGNORE")
+
+    def execute(self, sql, params=()):
+        self._result = self.db.execute(self._sql(sql), [str(p) if isinstance(p, datetime) else p for p in params])
+
+    def executemany(self, sql, rows):
+        self.db.executemany(self._sql(sql), [[str(p) if isinstance(p, datetime) else p for p in row]
+                                             for row in rows])
+
+    def fetchone(self):
+        return self._result.fetchone()
+
+    def fetchall(self):
+        return self._result.fetchall()
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        pass
+
+@contextmanager
+def database_backend(backend):
+    """Point database.connect_to_db at MySQL (DB_CONFIG) or the SQLite stand-in."""
+    if backend == "mysql":
+        yield "mysql"
+        return
+    original = database.connect_to_db
+    database.connect_to_db = SQLiteStandIn().connect
+    try:
+        yield "sqlite-stand-in"
+    finally:
+        database.connect_to_db = original
+
+def bench_db(rows=5000, backend="stand-in"):
+    """Rows per second for per-row save_to_db, the BatchWriter and the JournalWriter, plus journal append cost."""
+    states = {"power1": True, "power2": False, "power3": True}
+    with database_backend(backend) as name:
+        start = time.perf_counter()
+        for i in range(rows):
+            database.save_to_db(f"bench-{i % 100}", states, "Benchmark step", i)
+        single = time.perf_counter() - start
+
+        writer = database.BatchWriter(flush_interval=0.05, max_queue=rows + 1).start()
+        start = time.perf_counter()
+        for i in range(rows):
+            writer.submit(f"bench-{i % 100}", states, "Benchmark step", i)
+        writer.stop()
+        batched = time.perf_counter() - start
+        stats = writer.stats()
+
+        with tempfile.TemporaryDirectory() as directory:
+            writer = JournalWriter(Journal(directory), flush_interval=0.05).start()
+            start = time.perf_counter()
+            for i in range(rows):
+                writer.submit(f"bench-{i % 100}", states, "Benchmark step", i)
+            appended = time.perf_counter() - start
+            writer.stop()
+            journaled = time.perf_counter() - start
+    return {
+        "backend": name,
+        "rows": rows,
+        "save_to_db_rows_per_s": round(rows / single, 1),
+        "batch_writer_rows_per_s": round(rows / batched, 1),
+        "batch_writer_batches": stats["batches"],
+        "batch_writer_failed": stats["failed"],
+        "journal_submit_us": round(appended / rows * 1e6, 2),
+        "journal_writer_rows_per_s": round(rows / journaled, 1),
+    }
+
+def bench_token(validations=200000, refreshes=50):
+    """Cost of get_token() on a valid token and of a full refresh against the mock /token."""
+    with mock_api(devices=1) as (api, server), tempfile.TemporaryDirectory() as directory:
+        client = HeyHomeClient(server.url)
+        tokens = TokenManager(client, env_file=os.path.join(directory, ".env"))
+        tokens.refresh(stale_token=tokens.get_token() or "none")
+
+        start = time.perf_counter()
+        for _ in range(validations):
+            tokens.get_token()
+        validate = time.perf_counter() - start
+
+        samples = []
+        for _ in range(refreshes):
+            start = time.perf_counter()
+            tokens.refresh(stale_token=tokens.get_token())
+            samples.append(time.perf_counter() - start)
+        client.close()
+    return {
+        "validate_ns": round(validate / validations * 1e9, 1),
+        "refreshes": tokens.refresh_count,
+        **{f"refresh_{key}": value for key, value in latency_summary(samples).items()},
+    }
+
+def write_steps_file(path, rows):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["description", "power1", "power2", "power3", "duration", "cycle"])
+        for i in range(rows):
+            writer.writerow([f"Step {i}", i % 2 == 0, i % 3 == 0, True, 30, i // 10 + 1])
+
+def bench_steps(rows=100000, lookups=100000):
+    """Parse, cache-hit and compile time for a large steps file, plus state lookups per second."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "steps.csv")
+        write_steps_file(path, rows)
+
+        start = time.perf_counter()
+        steps = load_steps_from_csv(path)
+        parse = time.perf_counter() - start
+
+        load_step_table(path)
+        start = time.perf_counter()
+        load_step_table(path)
+        cached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    schedule = compile_schedule(steps)
+    compile_time = time.perf_counter() - start
+
+    step = schedule.period / lookups
+    start = time.perf_counter()
+    for i in range(lookups):
+        schedule.state_at(i * step)
+    lookup = time.perf_counter() - start
+    return {
+        "rows": len(steps),
+        "parse_ms": round(parse * 1000, 1),
+        "cached_load_ms": round(cached * 1000, 3),
+        "compile_ms": round(compile_time * 1000, 1),
+        "state_at_per_s": round(lookups / lookup, 1),
+    }
+
+BENCHMARKS = {
+    "control": bench_control,
+    "jitter": bench_jitter,
+    "db": bench_db,
+    "token": bench_token,
+    "steps": bench_steps,
+}
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline):
+    """Percent change of every numeric metric against a previous results file."""
+    changes = {}
+    for name, metrics in results.items():
+        for key, value in metrics.items():
+            old = baseline.get("results", {}).get(name, {}).get(key)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                changes[f"{name}.{key}"] = round((value - old) / old * 100, 1)
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the control, persistence and auth hot paths.")
+    parser.add_argument("benchmarks", nargs="*", choices=[[], *BENCHMARKS], help="default: all")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--db", choices=["stand-in", "mysql"], default="stand-in",
+                        help="database for the db benchmark (mysql uses DB_CONFIG from .env)")
+    parser.add_argument("--repeat", type=int, default=1, help="run each benchmark n times and keep the median")
+    args = parser.parse_args()
+
+    # 벤치마크 중 단계/요청마다 남는 INFO 로그는 측정을 왜곡하므로 끔
+    logging.disable(logging.INFO)
+    results = {}
+    for name in args.benchmarks or BENCHMARKS:
+        kwargs = {"backend": args.db} if name == "db" else {}
+        runs = [BENCHMARKS[name](**kwargs) for _ in range(args.repeat)]
+        results[name] = {
+            key: statistics.median(run[key] for run in runs) if isinstance(value, (int, float)) else value
+            for key, value in runs[0].items()
+        }
+    report = {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as file:
+            report["change_pct"] = compare(results, json.load(file))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+if __name__ == "__main__":
+    main()
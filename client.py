@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    BASE_URL, HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT,
+)
+from metrics import API_LATENCY, CIRCUIT_STATE
+
+def is_failure(status):
+    """Whether a status (or "error" for no response) means the API itself is unhealthy."""
+    return status == "error" or status == 429 or status >= 500
+
+class CircuitOpenError(requests.RequestException):
+    """The endpoint's circuit breaker is open, so the request was not sent."""
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"{endpoint} circuit open, next probe in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Fail fast after consecutive failures; after reset_timeout let a single probe through to test recovery."""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, endpoint, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT,
+                 clock=time.monotonic):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(self.state, endpoint=endpoint)
+
+    def retry_after(self):
+        """Seconds until the next probe is allowed (0 unless open)."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - self.clock())
+
+    def allow(self):
+        """Raise CircuitOpenError unless a request may be sent now."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.retry_after() > 0:
+                    raise CircuitOpenError(self.endpoint, self.retry_after())
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                # 시험 요청은 하나만 보내고 결과가 나올 때까지 나머지는 바로 실패
+                if self._probing:
+                    raise CircuitOpenError(self.endpoint, 0.0)
+                self._probing = True
+
+    def record(self, status):
+        with self._lock:
+            self._probing = False
+            if not is_failure(status):
+                self.failures = 0
+                self._set_state(self.CLOSED)
+                return
+            self.failures += 1
+            # 이미 열린 동안 끝난 요청의 실패는 차단 시간을 늘리지 않음
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self._opened_at = self.clock()
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        if state == self.OPEN:
+            logging.error(f"HeyHome {self.endpoint} API unhealthy ({self.failures} failure(s)), "
+                          f"failing fast for {self.reset_timeout}s.")
+        elif state == self.CLOSED:
+            logging.info(f"HeyHome {self.endpoint} API recovered, circuit closed.")
+        self.state = state
+        CIRCUIT_STATE.set(state, endpoint=self.endpoint)
+
+class HeyHomeClient:
+    """HeyHome Open API client on a pooled keep-alive session."""
+
+    def __init__(self, base_url=BASE_URL, access_token=None, token_provider=None, pool_size=HTTP_POOL_SIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT):
+        self.base_url = (base_url or "").rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # pool_block=True: 호스트당 연결 수를 pool_size 이하로 제한
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        if access_token:
+            self.set_token(access_token)
+        # get_token()/refresh(stale_token)을 제공하는 객체 (auth.TokenManager)
+        self.token_provider = token_provider
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def set_token(self, access_token):
+        """Use the given access token for subsequent requests."""
+        self.session.headers["Authorization"] = f"Bearer {access_token}"
+
+    def _request(self, method, endpoint, path, auth=True, **kwargs):
+        """Send a request; with a token provider, a 401 refreshes the token and retries once."""
+        if not (auth and self.token_provider):
+            return self._send(method, endpoint, path, **kwargs)
+        token = self.token_provider.get_token()
+        response = self._send(method, endpoint, path, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+        if response.status_code == 401:
+            token = self.token_provider.refresh(stale_token=token)
+            if token:
+                response = self._send(method, endpoint, path, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+        return response
+
+    def breaker(self, endpoint):
+        """The circuit breaker guarding an endpoint."""
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(endpoint)
+            return self._breakers[endpoint]
+
+    def _send(self, method, endpoint, path, **kwargs):
+        """Send a request and record its latency under the endpoint name; fails fast while the circuit is open."""
+        breaker = self.breaker(endpoint)
+        breaker.allow()
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        status = "error"  # 응답을 받지 못한 경우 (연결 실패, 타임아웃)
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            breaker.record(status)
+            self._record(endpoint, time.perf_counter() - start, status)
+
+    def _record(self, endpoint, elapsed, status):
+        API_LATENCY.observe(elapsed, endpoint=endpoint, status=status)
+        failed = status == "error" or status >= 400
+        with self._lock:
+            stat = self._stats.setdefault(endpoint, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0})
+            stat["count"] += 1
+            stat["errors"] += failed
+            stat["total"] += elapsed
+            stat["max"] = max(stat["max"], elapsed)
+
+    def stats(self):
+        """Return per-endpoint request counts and latencies in seconds."""
+        with self._lock:
+            return {
+                endpoint: {**stat, "avg": stat["total"] / stat["count"]}
+                for endpoint, stat in self._stats.items()
+            }
+
+    def control(self, device_id, states=None, body=None):
+        """Set the port states of a device, from a states dict or a pre-encoded JSON body."""
+        if body is not None:
+            return self._request("POST", "control", f"/control/{device_id}", data=body)
+        return self._request("POST", "control", f"/control/{device_id}", json={"requirments": states})
+
+    def device(self, device_id):
+        """Fetch the current status of a device."""
+        return self._request("GET", "device", f"/device/{device_id}")
+
+    def devices(self):
+        """Fetch the list of devices."""
+        return self._request("GET", "devices", "/devices")
+
+    def token(self, encrypted_data):
+        """Exchange AES256-encrypted credentials for a token."""
+        # 토큰 발급 요청에는 기존 Authorization 헤더를 보내지 않음
+        return self._request("POST", "token", "/token", auth=False, json={"data": encrypted_data},
+                             headers={"Authorization": None})
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
@@ -1,22 +1,93 @@
 import os
 from dotenv import load_dotenv
-import logging
+from logging_setup import setup_logging
 
 # .env 파일 로드
 load_dotenv()
 
-# 공통 로깅 설정
-LOG_FILE = "log_file.log"
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
+# 공통 로깅 설정 (큐를 거쳐 백그라운드 스레드가 파일에 기록, 크기/시간 기준 교체 후 gzip 압축)
+LOG_FILE = os.getenv("LOG_FILE", "log_file.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_JSON = os.getenv("LOG_JSON", "false").strip().lower() in ("1", "true", "yes", "on")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 10))
+LOG_ROTATE_SECONDS = int(os.getenv("LOG_ROTATE_SECONDS", 86400))
+setup_logging(
+    LOG_FILE,
+    level=LOG_LEVEL,
+    json_format=LOG_JSON,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    rotate_seconds=LOG_ROTATE_SECONDS,
 )
 
 # 공통 환경 변수
 BASE_URL = os.getenv("BASE_URL")
 DEVICE_ID = os.getenv("DEVICE_ID")
+# 여러 장치를 동시에 제어할 때는 DEVICE_IDS에 쉼표로 구분해서 지정 (없으면 DEVICE_ID 사용)
+DEVICE_IDS = [d.strip() for d in os.getenv("DEVICE_IDS", DEVICE_ID or "").split(",") if d.strip()]
+# 장치 상태 캐시 유지 시간 (초)
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", 30))
+# 컨트롤러 -> 대시보드 실시간 이벤트 전달용 Unix 소켓 경로
+EVENTS_SOCKET = os.getenv("EVENTS_SOCKET", "heyhome_events.sock")
+# 컨트롤러 감시 프로세스 제어 소켓, 재시작 최대 대기 시간, 종료 대기 시간 (초)
+CONTROL_SOCKET = os.getenv("CONTROL_SOCKET", "heyhome_control.sock")
+SUPERVISOR_MAX_BACKOFF = float(os.getenv("SUPERVISOR_MAX_BACKOFF", 300))
+SUPERVISOR_STOP_TIMEOUT = float(os.getenv("SUPERVISOR_STOP_TIMEOUT", 30))
+# 실행 중 steps.csv 변경 확인 주기 (초)
+STEPS_WATCH_INTERVAL = float(os.getenv("STEPS_WATCH_INTERVAL", 5))
+# 컨트롤러의 Prometheus /metrics 포트 (0이면 사용 안 함)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+# 토큰 정보를 저장하는 파일과 만료 전 미리 갱신할 여유 시간 (초)
+ENV_FILE = os.getenv("ENV_FILE", ".env")
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", 86400))
+# 제어/DB 호출을 처리할 작업 스레드 수 (장치 수와 무관하게 고정)
+CONTROL_WORKERS = int(os.getenv("CONTROL_WORKERS", 32))
+
+# HeyHome API HTTP 설정 (호스트당 연결 수 제한, 연결/응답 타임아웃 초)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", CONTROL_WORKERS))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+# 제어 실패 시 재시도 (첫 대기 초, 최대 대기 초, 다음 단계 deadline 전에 남겨 둘 여유 초)
+CONTROL_RETRY_BASE = float(os.getenv("CONTROL_RETRY_BASE", 0.5))
+CONTROL_RETRY_MAX = float(os.getenv("CONTROL_RETRY_MAX", 30))
+CONTROL_RETRY_MARGIN = float(os.getenv("CONTROL_RETRY_MARGIN", HTTP_CONNECT_TIMEOUT))
+# API 엔드포인트별 차단기: 연속 실패 횟수, 차단 후 시험 요청까지 대기 시간 (초)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))
+
+# power_status 일괄 저장 설정 (배치 크기, 최대 대기 시간 초, 큐 최대 길이)
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", 100))
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", 1.0))
+DB_QUEUE_SIZE = int(os.getenv("DB_QUEUE_SIZE", 100000))
+# 상태 기록을 먼저 남길 로컬 저널 디렉터리 (비우면 메모리 큐만 사용), 세그먼트 크기, 저장 실패 시 최대 재시도 간격 (초)
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journal")
+JOURNAL_SEGMENT_BYTES = int(os.getenv("JOURNAL_SEGMENT_BYTES", 16 * 1024 * 1024))
+JOURNAL_RETRY_MAX = float(os.getenv("JOURNAL_RETRY_MAX", 60))
+
+# MySQL 연결 풀 설정 (풀 크기 최대 32, 대여 대기 시간 초, 재연결 시도 횟수)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))
+DB_RECONNECT_ATTEMPTS = int(os.getenv("DB_RECONNECT_ATTEMPTS", 3))
+# 스키마 마이그레이션: 미리 만들어 둘 월별 파티션 수, 기존 행 복사 단위
+DB_PARTITION_MONTHS_AHEAD = int(os.getenv("DB_PARTITION_MONTHS_AHEAD", 3))
+DB_MIGRATION_CHUNK = int(os.getenv("DB_MIGRATION_CHUNK", 50000))
+# 포트 ON 시간 집계 주기 (초, 0이면 컨트롤러에서 실행 안 함), 한 번에 읽을 행 수,
+# 컨트롤러가 멈춘 공백을 ON 시간으로 계산하는 최대 길이 (초)
+ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", 60))
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", 10000))
+ROLLUP_MAX_GAP = int(os.getenv("ROLLUP_MAX_GAP", 3600))
+# 기록 내보내기(/export) 시 DB에서 한 번에 가져올 행 수
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 1000))
+# 상태 기록 저장소 (쉼표로 구분: mysql, influxdb) 및 InfluxDB 연결 설정
+STORAGE_BACKENDS = [b.strip().lower() for b in os.getenv("STORAGE_BACKENDS", "mysql").split(",") if b.strip()]
+INFLUX_URL = os.getenv("INFLUX_URL", "http://localhost:8086")
+INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
+INFLUX_ORG = os.getenv("INFLUX_ORG")
+INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "heyhome")
+INFLUX_MEASUREMENT = os.getenv("INFLUX_MEASUREMENT", "port_state")
+INFLUX_TIMEOUT = int(os.getenv("INFLUX_TIMEOUT", 10000))  # 밀리초
 DB_CONFIG = {
     "host": os.getenv("DB_HOST"),
     "port": int(os.getenv("DB_PORT", 3306)),
@@ -1,51 +1,645 @@
+import argparse
+import json
 import mysql.connector
-from config import DB_CONFIG, LOG_FILE
+from mysql.connector import pooling
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from config import (
+    DB_CONFIG, LOG_FILE, DB_BATCH_SIZE, DB_FLUSH_INTERVAL, DB_QUEUE_SIZE,
+    DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_RECONNECT_ATTEMPTS, STORAGE_BACKENDS,
+    DB_PARTITION_MONTHS_AHEAD, DB_MIGRATION_CHUNK,
+    INFLUX_URL, INFLUX_TOKEN, INFLUX_ORG, INFLUX_BUCKET, INFLUX_MEASUREMENT, INFLUX_TIMEOUT,
+)
+from metrics import DB_BATCH_ROWS, DB_QUEUE_DEPTH, DB_WRITE_LATENCY
 import logging
 
+try:
+    from influxdb_client import InfluxDBClient, WritePrecision
+    from influxdb_client.client.write_api import SYNCHRONOUS
+except ImportError:  # InfluxDB 저장소를 쓰지 않으면 필요 없음
+    InfluxDBClient = None
+
+# 장치 ID와 단계 설명은 조회 테이블의 작은 정수 키로 저장 (스키마 버전 2)
+INSERT_STATUS_SQL = """
+    INSERT INTO power_status (cycle_id, timestamp, device_key, fog, plasma, pump, description_key)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 세션 초기화 왕복을 줄이기 위해 반납 시 reset_session을 하지 않음
+            _pool = pooling.MySQLConnectionPool(
+                pool_name="heyhome",
+                pool_size=DB_POOL_SIZE,
+                pool_reset_session=False,
+                **DB_CONFIG,
+            )
+            logging.info(f"Database connection pool created (size {DB_POOL_SIZE}).")
+        return _pool
+
 def connect_to_db():
-    """Create a new database connection."""
+    """Borrow a healthy connection from the shared pool; close() returns it."""
+    deadline = time.monotonic() + DB_POOL_TIMEOUT
+    attempts = 0
+    while True:
+        try:
+            # get_connection은 대여 시 연결을 ping하고, 끊어졌으면 재연결함
+            return get_pool().get_connection()
+        except pooling.PoolError as e:
+            if time.monotonic() >= deadline:
+                logging.error(f"Database connection error: {e}")
+                return None
+            time.sleep(0.05)
+        except mysql.connector.Error as e:
+            attempts += 1
+            if attempts >= DB_RECONNECT_ATTEMPTS:
+                logging.error(f"Database connection error: {e}")
+                return None
+            time.sleep(min(2 ** attempts * 0.1, 2))
+
+def release_connection(conn):
+    """End any open transaction and return the connection to the pool."""
+    # pool_reset_session=False이므로 열린 트랜잭션(REPEATABLE READ 스냅샷)이 다음 대여자에게 넘어가지 않도록 롤백
     try:
-        return mysql.connector.connect(**DB_CONFIG)
+        conn.rollback()
     except mysql.connector.Error as e:
-        logging.error(f"Database connection error: {e}")
-        return None
+        logging.warning(f"Rollback before returning a connection failed: {e}")
+    conn.close()
 
-def initialize_db():
-    """Initialize the database schema."""
+@contextmanager
+def db_cursor(**cursor_args):
+    """Yield a cursor on a pooled connection and return it to the pool afterwards."""
     conn = connect_to_db()
     if not conn:
-        return
+        raise mysql.connector.Error("Database unavailable")
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS power_status (
-                id INT AUTO_INCREMENT PRIMARY KEY,
+        cursor = conn.cursor(**cursor_args)
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+    finally:
+        release_connection(conn)
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+def add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, index + 1, 1)
+
+def partition_clause(month):
+    """Monthly RANGE COLUMNS partition holding rows of the given month."""
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}')"
+
+def _table_exists(cursor, table):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,),
+    )
+    return cursor.fetchone()[0] > 0
+
+def _columns(cursor, table):
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,),
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+def _migration_1(cursor):
+    # 최초 스키마 (설명/장치 ID를 행마다 문자열로 저장)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS power_status (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            cycle_id INT NOT NULL,
+            timestamp DATETIME NOT NULL,
+            device_id VARCHAR(255) NOT NULL,
+            fog BOOLEAN NOT NULL,
+            plasma BOOLEAN NOT NULL,
+            pump BOOLEAN NOT NULL,
+            description TEXT NOT NULL
+        )
+    """)
+
+def _migration_2(cursor):
+    # 조회 테이블 (utf8mb4_bin: 대소문자가 다른 설명을 서로 다른 키로 유지)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS devices (
+            id MEDIUMINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            device_id VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+            UNIQUE KEY uq_device_id (device_id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS step_descriptions (
+            id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            description VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+            UNIQUE KEY uq_description (description)
+        )
+    """)
+
+    # 기존 행 복사(백필)는 시작 경로를 막지 않도록 backfill_v1()에서 따로 진행
+    if not _table_exists(cursor, "power_status_v1"):
+        cursor.execute("SELECT COALESCE(MAX(id), 0), MIN(timestamp) FROM power_status")
+        last_id, first = cursor.fetchone()
+        first_month = month_start(first or datetime.now())
+        last_month = add_months(month_start(datetime.now()), DB_PARTITION_MONTHS_AHEAD)
+        months = []
+        while first_month <= last_month:
+            months.append(first_month)
+            first_month = add_months(first_month, 1)
+        # 파티션 키(timestamp)는 기본 키에 포함되어야 하고, 분할 테이블은 외래 키를 지원하지 않음
+        cursor.execute(f"""
+            CREATE TABLE power_status_v2 (
+                id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
                 cycle_id INT NOT NULL,
                 timestamp DATETIME NOT NULL,
-                device_id VARCHAR(255) NOT NULL,
+                device_key MEDIUMINT UNSIGNED NOT NULL,
                 fog BOOLEAN NOT NULL,
                 plasma BOOLEAN NOT NULL,
                 pump BOOLEAN NOT NULL,
-                description TEXT NOT NULL
+                description_key SMALLINT UNSIGNED NOT NULL,
+                PRIMARY KEY (id, timestamp),
+                KEY idx_device_time (device_key, timestamp)
+            ) AUTO_INCREMENT={last_id + 1}
+            PARTITION BY RANGE COLUMNS(timestamp) (
+                {", ".join(partition_clause(month) for month in months)},
+                PARTITION pmax VALUES LESS THAN (MAXVALUE)
             )
         """)
-        conn.commit()
-        logging.info("Database initialized successfully.")
+        cursor.execute("RENAME TABLE power_status TO power_status_v1, power_status_v2 TO power_status")
+
+    cursor.execute("""
+        CREATE OR REPLACE VIEW power_status_view AS
+        SELECT p.id, p.cycle_id, p.timestamp, d.device_id, p.fog, p.plasma, p.pump, s.description
+        FROM power_status p
+        JOIN devices d ON d.id = p.device_key
+        JOIN step_descriptions s ON s.id = p.description_key
+    """)
+
+def _backfill_range(cursor):
+    """(last id copied, last id to copy) of the power_status_v1 backfill; equal when there is nothing left."""
+    if not _table_exists(cursor, "power_status_v1"):
+        return 0, 0
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM power_status_v1")
+    last_id = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM power_status WHERE id <= %s", (last_id,))
+    return cursor.fetchone()[0], last_id
+
+def backfill_pending(cursor):
+    """Whether power_status_v1 still has rows the backfill has not copied."""
+    copied, last_id = _backfill_range(cursor)
+    return copied < last_id
+
+def _backfill_v1(cursor):
+    """Copy power_status_v1 rows into the new table in id ranges, keeping their ids (resumable)."""
+    copied, last_id = _backfill_range(cursor)
+    if copied >= last_id:
+        return 0
+    start = copied
+    cursor.execute("""
+        INSERT IGNORE INTO devices (device_id)
+        SELECT DISTINCT device_id FROM power_status_v1
+    """)
+    cursor.execute("""
+        INSERT IGNORE INTO step_descriptions (description)
+        SELECT DISTINCT LEFT(description, 255) FROM power_status_v1
+    """)
+    # 예전 create_database.py로 만든 테이블에는 cycle_id 열이 없음
+    cycle = "p.cycle_id" if "cycle_id" in _columns(cursor, "power_status_v1") else "0"
+    while copied < last_id:
+        end = min(copied + DB_MIGRATION_CHUNK, last_id)
+        cursor.execute(f"""
+            INSERT IGNORE INTO power_status
+                (id, cycle_id, timestamp, device_key, fog, plasma, pump, description_key)
+            SELECT p.id, {cycle}, p.timestamp, d.id, p.fog, p.plasma, p.pump, s.id
+            FROM power_status_v1 p
+            JOIN devices d ON d.device_id = p.device_id COLLATE utf8mb4_bin
+            JOIN step_descriptions s ON s.description = LEFT(p.description, 255) COLLATE utf8mb4_bin
+            WHERE p.id > %s AND p.id <= %s
+        """, (copied, end))
+        cursor.execute("COMMIT")
+        copied = end
+        logging.info(f"Backfilled power_status up to id {copied} of {last_id}.")
+    return copied - start
+
+def _migration_3(cursor):
+    # 시간/일별 포트 ON 누적 시간 (rollup.py가 새 행만 반영해 갱신)
+    for table, column, kind in (("duty_cycle_hourly", "hour", "DATETIME"), ("duty_cycle_daily", "day", "DATE")):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                device_key MEDIUMINT UNSIGNED NOT NULL,
+                port TINYINT UNSIGNED NOT NULL,
+                {column} {kind} NOT NULL,
+                on_seconds INT UNSIGNED NOT NULL,
+                PRIMARY KEY (device_key, port, {column}),
+                KEY idx_{column} ({column})
+            )
+        """)
+    # 장치별 마지막으로 반영한 행의 시각과 포트 상태, 전체 처리 위치
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            device_key MEDIUMINT UNSIGNED NOT NULL PRIMARY KEY,
+            last_timestamp DATETIME NOT NULL,
+            fog BOOLEAN NOT NULL,
+            plasma BOOLEAN NOT NULL,
+            pump BOOLEAN NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_watermark (
+            id TINYINT UNSIGNED NOT NULL PRIMARY KEY,
+            last_id BIGINT UNSIGNED NOT NULL
+        )
+    """)
+
+# (버전, 설명, 적용 함수) - 한 번 적용된 버전은 schema_version에 기록되어 다시 실행되지 않음
+MIGRATIONS = [
+    (1, "power_status table", _migration_1),
+    (2, "device/description lookup tables, (device, timestamp) index, monthly partitions", _migration_2),
+    (3, "hourly and daily duty-cycle rollup tables", _migration_3),
+]
+
+def ensure_partitions(cursor, months_ahead=DB_PARTITION_MONTHS_AHEAD):
+    """Split the catch-all partition so the coming months each get their own partition."""
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'power_status' AND PARTITION_NAME IS NOT NULL
+    """)
+    names = {row[0] for row in cursor.fetchall()}
+    if "pmax" not in names:
+        return
+    months = [datetime.strptime(name[1:], "%Y%m").date() for name in names if name != "pmax"]
+    month = add_months(max(months), 1) if months else month_start(datetime.now())
+    wanted = []
+    while month <= add_months(month_start(datetime.now()), months_ahead):
+        wanted.append(partition_clause(month))
+        month = add_months(month, 1)
+    if wanted:
+        cursor.execute(f"""
+            ALTER TABLE power_status REORGANIZE PARTITION pmax INTO (
+                {", ".join(wanted)},
+                PARTITION pmax VALUES LESS THAN (MAXVALUE)
+            )
+        """)
+        logging.info(f"Added {len(wanted)} monthly partition(s) to power_status.")
+
+def initialize_db():
+    """Bring the database schema up to the latest version and add upcoming monthly partitions."""
+    conn = connect_to_db()
+    if not conn:
+        return
+    try:
+        cursor = conn.cursor(buffered=True)
+        # 여러 프로세스가 동시에 시작해도 마이그레이션은 한 곳에서만 실행
+        cursor.execute("SELECT GET_LOCK('heyhome_schema', 600)")
+        if cursor.fetchone()[0] != 1:
+            # 시간 초과(0)나 오류(NULL)면 잠금 없이 마이그레이션하지 않음
+            logging.error("Database migration skipped: could not acquire the schema lock.")
+            return
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT NOT NULL PRIMARY KEY,
+                    description VARCHAR(255) NOT NULL,
+                    applied_at DATETIME NOT NULL
+                )
+            """)
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            current = cursor.fetchone()[0]
+            for version, description, migration in MIGRATIONS:
+                if version <= current:
+                    continue
+                logging.info(f"Applying schema migration {version}: {description}")
+                migration(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                    (version, description, datetime.now()),
+                )
+                conn.commit()
+            ensure_partitions(cursor)
+            conn.commit()
+            if backfill_pending(cursor):
+                logging.warning("Rows from before schema version 2 are not copied yet; run `python3 database.py backfill`.")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('heyhome_schema')")
+            cursor.fetchone()
+        logging.info(f"Database initialized successfully (schema version {MIGRATIONS[-1][0]}).")
+    except mysql.connector.Error as e:
+        logging.error(f"Database migration failed: {e}")
+    finally:
+        release_connection(conn)
+
+def backfill_v1():
+    """Copy rows left in power_status_v1 by schema migration 2; returns the number of ids copied."""
+    conn = connect_to_db()
+    if not conn:
+        return 0
+    try:
+        cursor = conn.cursor(buffered=True)
+        # 여러 곳에서 실행해도 한 번에 하나만 진행
+        cursor.execute("SELECT GET_LOCK('heyhome_backfill', 0)")
+        if cursor.fetchone()[0] != 1:
+            logging.info("Backfill is already running elsewhere.")
+            return 0
+        try:
+            return _backfill_v1(cursor)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('heyhome_backfill')")
+            cursor.fetchone()
+    except mysql.connector.Error as e:
+        logging.error(f"Backfill failed: {e}")
+        return 0
     finally:
-        conn.close()
+        release_connection(conn)
+
+class LookupTable:
+    """Small-integer keys for repeated strings (device ids, step descriptions), cached in memory."""
+
+    def __init__(self, table, column, max_length=255):
+        self.table = table
+        self.column = column
+        self.max_length = max_length
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def _select(self, cursor, values):
+        placeholders = ", ".join(["%s"] * len(values))
+        cursor.execute(f"SELECT id, {self.column} FROM {self.table} WHERE {self.column} IN ({placeholders})",
+                       values)
+        self._keys.update((value, key) for key, value in cursor.fetchall())
+
+    def keys(self, conn, cursor, values):
+        """Map each value to its key, inserting (and committing) values seen for the first time."""
+        with self._lock:
+            missing = sorted({value for value in values if value not in self._keys})
+            if missing:
+                self._select(cursor, missing)
+                # 이미 있는 값은 INSERT하지 않아 AUTO_INCREMENT 번호를 낭비하지 않음
+                new = [value for value in missing if value not in self._keys]
+                if new:
+                    cursor.executemany(f"INSERT IGNORE INTO {self.table} ({self.column}) VALUES (%s)",
+                                       [(value,) for value in new])
+                    # 캐시한 키가 배치 실패로 롤백되지 않도록 조회 테이블 INSERT는 먼저 커밋
+                    conn.commit()
+                    self._select(cursor, new)
+            return self._keys
+
+DEVICE_KEYS = LookupTable("devices", "device_id")
+DESCRIPTION_KEYS = LookupTable("step_descriptions", "description")
+
+def to_db_rows(conn, cursor, rows):
+    """Replace device_id and description of status rows with their lookup keys."""
+    descriptions = [row[6][:DESCRIPTION_KEYS.max_length] for row in rows]
+    device_keys = DEVICE_KEYS.keys(conn, cursor, [row[2] for row in rows])
+    description_keys = DESCRIPTION_KEYS.keys(conn, cursor, descriptions)
+    return [
+        (cycle_id, timestamp, device_keys[device_id], fog, plasma, pump, description_keys[description])
+        for (cycle_id, timestamp, device_id, fog, plasma, pump, _), description in zip(rows, descriptions)
+    ]
+
+def status_row(device_id, states, description, cycle_id, timestamp=None):
+    """Build a power_status row tuple in INSERT_STATUS_SQL column order."""
+    return (
+        cycle_id,
+        timestamp or datetime.now(),
+        device_id,
+        bool(states.get("power1")),
+        bool(states.get("power2")),
+        bool(states.get("power3")),
+        description,
+    )
 
 def save_to_db(device_id, states, description, cycle_id):
     """Insert a new status record into the database."""
+    start = time.monotonic()
     conn = connect_to_db()
     if not conn:
         return
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO power_status (cycle_id, timestamp, device_id, fog, plasma, pump, description)
-            VALUES (%s, NOW(), %s, %s, %s, %s, %s)
-        """, (cycle_id, device_id, states.get("power1"), states.get("power2"), states.get("power3"), description))
+        row, = to_db_rows(conn, cursor, [status_row(device_id, states, description, cycle_id)])
+        cursor.execute(INSERT_STATUS_SQL, row)
         conn.commit()
+        DB_WRITE_LATENCY.observe(time.monotonic() - start, backend="mysql", result="ok")
+        DB_BATCH_ROWS.observe(1)
         logging.info(f"State saved to database: {states}, Description: {description}, Cycle: {cycle_id}")
     finally:
-        conn.close()
+        release_connection(conn)
+
+class StorageError(Exception):
+    """A storage backend could not write a batch."""
+
+class StorageBackend:
+    """Destination for batches of status_row() tuples; BatchWriter writes every batch to each backend."""
+
+    name = None
+
+    def write(self, rows):
+        """Write the rows or raise StorageError."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class MySQLBackend(StorageBackend):
+    """Insert rows into the MySQL power_status table."""
+
+    name = "mysql"
+
+    def write(self, rows):
+        conn = connect_to_db()
+        if not conn:
+            raise StorageError("database unavailable")
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(INSERT_STATUS_SQL, to_db_rows(conn, cursor, rows))
+            conn.commit()
+        except (mysql.connector.Error, KeyError) as e:
+            raise StorageError(e) from e
+        finally:
+            release_connection(conn)
+
+PORT_COLUMNS = ("power1", "power2", "power3")  # status_row()의 fog, plasma, pump 순서
+
+def _escape_tag(value):
+    return re.sub(r"([,= \\])", r"\\\1", str(value))
+
+def _escape_string(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def to_line_protocol(row, measurement=INFLUX_MEASUREMENT):
+    """One line-protocol point per port of a status row, tagged by device and port."""
+    cycle_id, timestamp, device_id, *states, description = row
+    # 초 단위로 자르면 같은 초에 바뀐 상태가 같은 점으로 덮어써지므로 datetime의 마이크로초까지 유지 (ns 정밀도)
+    nanoseconds = round(timestamp.timestamp() * 1_000_000) * 1000
+    prefix = f"{_escape_tag(measurement)},device_id={_escape_tag(device_id)},port="
+    fields = f'cycle_id={int(cycle_id)}i,description="{_escape_string(description)}"'
+    return [
+        f"{prefix}{port} state={'true' if state else 'false'},{fields} {nanoseconds}"
+        for port, state in zip(PORT_COLUMNS, states)
+    ]
+
+class InfluxBackend(StorageBackend):
+    """Write port states to InfluxDB as batched line protocol (one point per device and port)."""
+
+    name = "influxdb"
+
+    def __init__(self, url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG, bucket=INFLUX_BUCKET,
+                 measurement=INFLUX_MEASUREMENT, timeout=INFLUX_TIMEOUT):
+        if InfluxDBClient is None:
+            raise StorageError("influxdb-client is not installed (pip install influxdb-client)")
+        self.bucket = bucket
+        self.org = org
+        self.measurement = measurement
+        self.client = InfluxDBClient(url=url, token=token, org=org, timeout=timeout)
+        self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+
+    def write(self, rows):
+        lines = [line for row in rows for line in to_line_protocol(row, self.measurement)]
+        try:
+            # 배치 전체를 한 번의 요청으로 전송
+            self.write_api.write(self.bucket, self.org, "\n".join(lines), write_precision=WritePrecision.NS)
+        except Exception as e:
+            raise StorageError(e) from e
+
+    def close(self):
+        self.client.close()
+
+BACKENDS = {"mysql": MySQLBackend, "influxdb": InfluxBackend}
+
+def get_backends(names=STORAGE_BACKENDS):
+    """Create the configured storage backends, skipping (and logging) any that cannot be set up."""
+    backends = []
+    for name in names:
+        try:
+            backends.append(BACKENDS[name]())
+        except KeyError:
+            logging.error(f"Unknown storage backend: {name}")
+        except StorageError as e:
+            logging.error(f"Storage backend {name} disabled: {e}")
+    return backends
+
+class BatchWriter:
+    """Queue power_status rows and write them in batches to the storage backends from a background thread."""
+
+    _STOP = object()
+
+    def __init__(self, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL, max_queue=DB_QUEUE_SIZE,
+                 backends=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backends = get_backends() if backends is None else backends
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._stats = {"written": 0, "batches": 0, "failed": 0, "dropped": 0,
+                       "last_flush_latency": 0.0, "max_flush_latency": 0.0}
+
+    def start(self):
+        """Start the background flush thread."""
+        DB_QUEUE_DEPTH.set_function(self.queue.qsize)
+        self._thread.start()
+        return self
+
+    def submit(self, device_id, states, description, cycle_id, timestamp=None):
+        """Queue a status record without blocking the caller."""
+        try:
+            self.queue.put_nowait(status_row(device_id, states, description, cycle_id, timestamp))
+        except queue.Full:
+            self._stats["dropped"] += 1
+            logging.error(f"DB write queue full, dropped record: {device_id}, {description}, Cycle: {cycle_id}")
+
+    def stop(self, timeout=None):
+        """Flush everything still queued and stop the background thread."""
+        if self._thread.is_alive():
+            self.queue.put(self._STOP)
+            self._thread.join(timeout)
+        for backend in self.backends:
+            backend.close()
+        logging.info(f"DB writer stopped: {self.stats()}")
+
+    def stats(self):
+        """Return queue depth, row counters (summed over backends) and flush latency in seconds."""
+        return {"queue_depth": self.queue.qsize(), **self._stats}
+
+    def _run(self):
+        batch = []
+        flush_at = None
+        while True:
+            timeout = None if flush_at is None else max(0.0, flush_at - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                break
+            if item is not None:
+                batch.append(item)
+                if flush_at is None:
+                    flush_at = time.monotonic() + self.flush_interval
+                # 쌓여 있는 행을 한 번에 가져와 배치를 채움
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        self._flush(batch)
+                        return
+                    batch.append(item)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= flush_at):
+                self._flush(batch)
+                batch = []
+                flush_at = None
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        start = time.monotonic()
+        DB_BATCH_ROWS.observe(len(batch))
+        # 저장소끼리는 독립적: 하나가 실패해도 나머지에는 그대로 기록
+        for backend in self.backends:
+            self._write(backend, batch)
+        self._stats["batches"] += 1
+        latency = time.monotonic() - start
+        self._stats["last_flush_latency"] = latency
+        self._stats["max_flush_latency"] = max(self._stats["max_flush_latency"], latency)
+
+    def _write(self, backend, batch):
+        """Write one batch to one backend; returns False (after logging) if it failed."""
+        start = time.monotonic()
+        result = "error"
+        try:
+            backend.write(batch)
+            self._stats["written"] += len(batch)
+            result = "ok"
+        except StorageError as e:
+            self._stats["failed"] += len(batch)
+            logging.error(f"Error saving {len(batch)} status records to {backend.name}: {e}")
+        finally:
+            DB_WRITE_LATENCY.observe(time.monotonic() - start, backend=backend.name, result=result)
+        return result == "ok"
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate the database schema or copy rows from before schema version 2.")
+    parser.add_argument("command", choices=["migrate", "backfill"])
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        initialize_db()
+        return
+    # 컨트롤러 시작과 별도로 실행 (중간에 멈춰도 다음 실행에서 이어서 복사)
+    print(json.dumps({"rows": backfill_v1()}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import random
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from client import CircuitOpenError, is_failure
+from config import CONTROL_WORKERS, STEPS_WATCH_INTERVAL, CONTROL_RETRY_BASE, CONTROL_RETRY_MAX, CONTROL_RETRY_MARGIN
+from metrics import CONTROL_RETRIES, STEP_LATENESS, STEPS
+from scheduler import DeadlineScheduler, JitterStats, MonotonicClock
+from schedule import compile_schedule, mask_to_states, states_to_mask
+from status_cache import port_states
+from utility import load_step_table
+
+class CycleEngine:
+    """Run independent step schedules for many devices in one event loop."""
+
+    def __init__(self, steps, client, writer, total_runtime=36000, status_cache=None, events=None,
+                 steps_file=None, clock=None, executor=None):
+        # 단계 표는 한 번만 컴파일해 모든 장치가 공유 (장치별 상태는 위치, cycle_id, scheduler뿐)
+        self.schedule = compile_schedule(steps)
+        self.version = 1  # 단계 표가 다시 로드될 때마다 증가
+        self.steps_file = steps_file
+        self._steps_etag = load_step_table(steps_file).etag if steps_file else None
+        self.client = client
+        self.writer = writer
+        self.total_runtime = total_runtime
+        self.status_cache = status_cache
+        self.events = events
+        self.jitter = JitterStats()
+        # 시뮬레이션에서는 가상 시계와 인라인 executor를 주입해 실제 시간 없이 실행
+        self.clock = clock or MonotonicClock()
+        self.executor = executor
+        # 장치별로 마지막으로 성공이 확인된 포트 상태 [알고 있는 포트 마스크, ON 마스크]
+        self.confirmed = {}
+        self._positions = {}  # device_id -> (scheduler, schedule, 일정 0초 지점의 offset)
+        self.counters = {"steps": 0, "sent": 0, "skipped": 0, "failed": 0, "retries": 0}
+        self._executor = None
+        self._tasks = []
+        self._stopped = False
+        self._resumed = None
+        self._reload_requested = None
+
+    async def run(self, device_ids):
+        """Run every device until the runtime is over."""
+        if self.schedule.period <= 0:
+            logging.error("No runnable cycles: every step is unmatched or has zero duration.")
+            return
+        self.publish("run", state="started", devices=len(device_ids))
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._reload_requested = asyncio.Event()
+        executor = self.executor or ThreadPoolExecutor(max_workers=CONTROL_WORKERS, thread_name_prefix="control")
+        with executor as self._executor:
+            if self.status_cache:
+                await self.seed_states(device_ids)
+            if self._stopped:
+                # 장치 상태를 읽는 동안 stop()이 호출되었으면 장치 작업을 시작하지 않음
+                device_ids = []
+            self._tasks = [asyncio.ensure_future(self.run_device(device_id)) for device_id in device_ids]
+            # 장치 작업보다 나중에 시작해야 가상 시계가 장치들이 시작되기 전에 시간을 옮기지 않음
+            watcher = asyncio.ensure_future(self.watch_steps()) if self.steps_file else None
+            results = await asyncio.gather(*self._tasks, return_exceptions=True)
+        if watcher:
+            watcher.cancel()
+        for device_id, result in zip(device_ids, results):
+            if isinstance(result, Exception):
+                logging.error(f"[{device_id}] Cycle control stopped: {result}")
+        logging.info(f"Step lateness (s): {self.jitter.summary()}")
+        logging.info(f"Control calls: {self.counters}")
+        self.publish("run", state="finished")
+
+    def stop(self):
+        """Cancel every device schedule; run() then returns normally."""
+        logging.info("Stopping cycle control.")
+        self._stopped = True
+        for task in self._tasks:
+            task.cancel()
+
+    def pause(self):
+        """Hold every device at its next step until resume()."""
+        if self._resumed and self._resumed.is_set():
+            logging.info("Cycle control paused.")
+            self._resumed.clear()
+            self.publish("run", state="paused")
+
+    def resume(self):
+        if self._resumed and not self._resumed.is_set():
+            logging.info("Cycle control resumed.")
+            self._resumed.set()
+            self.publish("run", state="started")
+
+    def request_reload(self):
+        """Re-read the steps file now instead of at the next poll."""
+        if self._reload_requested:
+            self._reload_requested.set()
+
+    async def watch_steps(self, interval=STEPS_WATCH_INTERVAL):
+        """Poll the steps file and swap in a new schedule when it changes."""
+        # 엔진 시계로 기다리므로 시뮬레이션에서도 가상 시간 기준으로 파일 변경을 확인함
+        self.clock.attach()
+        try:
+            while True:
+                requested = asyncio.ensure_future(self._reload_requested.wait())
+                poll = asyncio.ensure_future(self.clock.sleep_until(self.clock.now() + interval))
+                try:
+                    await asyncio.wait([requested, poll], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    requested.cancel()
+                    poll.cancel()
+                self._reload_requested.clear()
+                # load_step_table은 mtime/크기가 그대로면 stat 한 번으로 끝남
+                table = load_step_table(self.steps_file)
+                if table.etag != self._steps_etag:
+                    self._steps_etag = table.etag
+                    self.reload(table.steps)
+        finally:
+            self.clock.detach()
+
+    def reload(self, steps):
+        """Replace the schedule; each device switches to it at its next cycle boundary."""
+        schedule = compile_schedule(steps)
+        if schedule.period <= 0:
+            logging.error("Ignored reloaded steps: no runnable cycles.")
+            return False
+        self.schedule = schedule
+        self.version += 1
+        logging.info(f"Schedule reloaded (version {self.version}, {schedule.cycle_count} cycle(s)).")
+        self.publish("run", state="reloaded", version=self.version)
+        return True
+
+    def publish(self, event_type, **data):
+        if self.events:
+            self.events.publish(event_type, **data)
+
+    async def seed_states(self, device_ids):
+        """Start from the devices' current port states so the first steps can be coalesced too."""
+        try:
+            statuses = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.status_cache.refresh_all, device_ids
+            )
+        except Exception as e:
+            logging.error(f"Could not seed port states, every port will be sent on the first step: {e}")
+            return
+        for device_id, status in statuses.items():
+            try:
+                self.confirmed[device_id] = list(states_to_mask(port_states(status)))
+            except Exception as e:
+                # 상태 응답이 이상한 장치만 첫 단계에서 모든 포트를 보냄
+                logging.error(f"[{device_id}] Ignoring unexpected device status {status!r}: {e}",
+                              extra={"device_id": device_id})
+        logging.info(f"Seeded port states for {sum(1 for s in statuses.values() if s)} of {len(device_ids)} device(s).")
+
+    def schedule_anchor(self, device_id):
+        """Wall-clock time of offset 0 of the device's current schedule (shifted by pauses and reloads)."""
+        scheduler, _, anchor = self._positions[device_id]
+        return self.clock.wall() - timedelta(seconds=self.clock.now() - scheduler.start - anchor)
+
+    async def run_device(self, device_id):
+        """Run the step schedule of one device until the runtime is over."""
+        self.clock.attach()
+        try:
+            await self._run_device(device_id, DeadlineScheduler(clock=self.clock, jitter=self.jitter))
+        finally:
+            self.clock.detach()
+
+    async def _run_device(self, device_id, scheduler):
+        schedule = self.schedule
+        version = self.version
+        index = 0
+        cycle_id = 0
+        self._positions[device_id] = (scheduler, schedule, 0.0)
+
+        while True:
+            if schedule.is_cycle_start[index]:
+                if scheduler.offset >= self.total_runtime:
+                    break
+                cycle_id += 1
+                if version != self.version:
+                    # 사이클 경계에서만 새 일정으로 교체 (deadline과 cycle_id는 그대로 이어감)
+                    schedule, version = self.schedule, self.version
+                    index = schedule.cycle_starts[(cycle_id - 1) % schedule.cycle_count]
+                    self._positions[device_id] = (scheduler, schedule, scheduler.offset - schedule.offsets[index])
+                    logging.info(f"[{device_id}] Switched to schedule version {version} at cycle {cycle_id}")
+
+            # 각 단계는 실행 시작 시각 기준의 절대 deadline에 맞춰 실행
+            deadline = scheduler.next_deadline
+            lateness = await scheduler.wait()
+            STEP_LATENESS.observe(max(0.0, lateness))
+            if not self._resumed.is_set():
+                # 일시정지된 시간만큼 남은 일정을 모두 뒤로 미룸
+                await self._resumed.wait()
+                scheduler.shift(scheduler.clock.now() - deadline)
+            scheduler.advance(schedule.durations[index])
+            description, states = schedule.descriptions[index], schedule.states[index]
+            logging.info(f"[{device_id}] Executing: {description} (Cycle {cycle_id}, late {lateness:.3f}s)",
+                         extra={"device_id": device_id, "cycle_id": cycle_id, "step": description})
+            ok = await self.apply_step(device_id, schedule, index, deadline=scheduler.next_deadline)
+            STEPS.inc(device_id=device_id, result="ok" if ok else "failed")
+            now = scheduler.clock.wall()
+            if ok:
+                # DB 저장은 백그라운드 배치 writer에 맡겨 제어 경로를 막지 않음
+                self.writer.submit(device_id, states, description, cycle_id, now)
+            self.publish(
+                "step", device_id=device_id, cycle_id=cycle_id, description=description,
+                states=states, ok=ok, lateness=round(lateness, 3), time=now.isoformat(timespec="seconds"),
+                next_switch=(now + timedelta(seconds=scheduler.next_deadline - scheduler.clock.now())).isoformat(timespec="seconds"),
+                # 대시보드가 임의 시각의 예정 상태를 계산할 수 있도록 일정 시작 시각을 함께 전송
+                anchor=self.schedule_anchor(device_id).isoformat(timespec="milliseconds"),
+            )
+            index = (index + 1) % len(schedule)
+
+        # 마지막 단계의 유지 시간까지 기다린 뒤 종료
+        await scheduler.clock.sleep_until(scheduler.next_deadline)
+
+    def retry_delay(self, attempt):
+        """Exponential backoff with jitter, so devices that failed together do not retry together."""
+        delay = min(CONTROL_RETRY_MAX, CONTROL_RETRY_BASE * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def apply_step(self, device_id, schedule, index, deadline=None):
+        """Send only the ports that differ from the last confirmed state; True once the device matches.
+
+        Failed calls are retried with backoff as long as the retry starts before the next step's deadline.
+        """
+        confirmed = self.confirmed.setdefault(device_id, [0, 0])
+        context = {"device_id": device_id, "step": schedule.descriptions[index]}  # JSON 로그용 필드
+        known, values = confirmed
+        target = schedule.values[index]
+        changed = schedule.ports[index] & (~known | (values ^ target))
+        self.counters["steps"] += 1
+        if not changed:
+            self.counters["skipped"] += 1
+            logging.info(f"[{device_id}] State unchanged, control call skipped: {schedule.states[index]}",
+                         extra=context)
+            return True
+
+        body = schedule.body_for(index, changed)
+        attempt = 0
+        while True:
+            retryable = True
+            delay = self.retry_delay(attempt)
+            try:
+                # 블로킹 API 호출은 공용 스레드 풀에서 처리해 이벤트 루프를 막지 않음
+                response = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.client.control, device_id, None, body
+                )
+                self.counters["sent"] += 1
+                if response.status_code == 200:
+                    confirmed[0] = known | changed
+                    confirmed[1] = (values & ~changed) | (target & changed)
+                    changes = mask_to_states(changed, target)
+                    if self.status_cache:
+                        self.status_cache.update(device_id, changes)
+                    logging.info(f"[{device_id}] Device updated: {changes}", extra=context)
+                    return True
+                # 400/404 등은 다시 보내도 같으므로 재시도하지 않음
+                retryable = is_failure(response.status_code)
+                logging.error(f"[{device_id}] Failed to update device: {response.status_code}, {response.text}",
+                              extra=context)
+            except CircuitOpenError as e:
+                # API 장애 중에는 요청 없이 바로 실패하고, 시험 요청이 가능해질 때까지 기다림
+                delay = max(delay, e.retry_after)
+                logging.error(f"[{device_id}] Control call not sent: {e}", extra=context)
+            except Exception as e:
+                logging.error(f"[{device_id}] Error during step execution: {e}", extra=context)
+            # 다음 단계 deadline까지 응답을 받을 여유가 없으면 포기 (다음 단계가 다시 보냄)
+            if not retryable or deadline is None or self.clock.now() + delay > deadline - CONTROL_RETRY_MARGIN:
+                break
+            attempt += 1
+            self.counters["retries"] += 1
+            CONTROL_RETRIES.inc()
+            logging.info(f"[{device_id}] Retrying control call in {delay:.2f}s (attempt {attempt + 1})", extra=context)
+            await self.clock.sleep_until(self.clock.now() + delay)
+        # 실패한 포트는 실제 상태를 알 수 없으므로 다음 단계에서 다시 보냄
+        self.counters["failed"] += 1
+        confirmed[0] = known & ~changed
+        return False
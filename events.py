@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+from config import EVENTS_SOCKET
+
+class EventPublisher:
+    """Send controller events as JSON datagrams to the dashboard without ever blocking."""
+
+    def __init__(self, path=EVENTS_SOCKET):
+        self.path = path
+        self.dropped = 0
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def publish(self, event_type, **data):
+        try:
+            self._sock.sendto(json.dumps({"type": event_type, **data}, default=str).encode(), self.path)
+        except OSError:
+            # 대시보드가 없거나 수신 버퍼가 가득 차면 이벤트를 버림 (제어 루프 우선)
+            self.dropped += 1
+
+    def close(self):
+        self._sock.close()
+
+class EventBroker:
+    """Receive controller events on a Unix datagram socket and fan them out to subscribers."""
+
+    def __init__(self, path=EVENTS_SOCKET, backlog=100):
+        self.path = path
+        self.backlog = backlog
+        self.latest = {}  # device_id -> 마지막 이벤트 (새 구독자에게 먼저 전송)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Bind the socket and start the receiving thread (once per process)."""
+        with self._lock:
+            if self._thread:
+                return self
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self.path)
+            self._thread = threading.Thread(target=self._run, args=(sock,), name="event-broker", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self, sock):
+        while True:
+            try:
+                data = sock.recv(65536)
+                event = json.loads(data)
+            except (OSError, ValueError) as e:
+                logging.error(f"Error receiving controller event: {e}")
+                continue
+            self.broadcast(event)
+
+    def broadcast(self, event):
+        message = json.dumps(event)
+        with self._lock:
+            if event.get("device_id"):
+                self.latest[event["device_id"]] = message
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # 느린 클라이언트는 가장 오래된 이벤트를 버리고 최신 이벤트를 받음
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def last(self, device_id):
+        """The latest event received for a device, or None."""
+        with self._lock:
+            message = self.latest.get(device_id)
+        return json.loads(message) if message else None
+
+    def subscribe(self):
+        """Return a queue pre-filled with the latest event of every device."""
+        subscriber = queue.Queue(maxsize=self.backlog)
+        with self._lock:
+            for message in list(self.latest.values())[-self.backlog:]:
+                subscriber.put_nowait(message)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, keepalive=15):
+        """Yield Server-Sent Events for one client until it disconnects."""
+        subscriber = self.subscribe()
+        try:
+            while True:
+                try:
+                    message = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    # 프록시가 연결을 끊지 않도록 주석 줄을 보냄
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {message}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
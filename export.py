@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+import logging
+import mysql.connector
+from config import DB_CONFIG, EXPORT_CHUNK_ROWS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet 내보내기를 쓰지 않으면 필요 없음
+    pa = None
+
+COLUMNS = ["id", "cycle_id", "timestamp", "device_id", "fog", "plasma", "pump", "description"]
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def open_status_cursor(start, end, device_ids=None):
+    """Run the history query on a dedicated connection and return (connection, unbuffered cursor)."""
+    sql = """
+        SELECT p.id, p.cycle_id, p.timestamp, d.device_id, p.fog, p.plasma, p.pump, s.description
+        FROM power_status p
+        JOIN devices d ON d.id = p.device_key
+        JOIN step_descriptions s ON s.id = p.description_key
+        WHERE p.timestamp >= %s AND p.timestamp < %s
+    """
+    params = [start, end]
+    if device_ids:
+        sql += f" AND d.device_id IN ({', '.join(['%s'] * len(device_ids))})"
+        params += device_ids
+    # (device_key, timestamp) 인덱스 순서라 서버에서 정렬하지 않고 바로 전송 시작
+    sql += " ORDER BY p.device_key, p.timestamp, p.id"
+
+    # 오래 걸리는 내보내기가 공용 풀 연결을 붙잡지 않도록 전용 연결 사용
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        # 비버퍼 커서: 결과를 서버에서 조금씩 받아오므로 메모리 사용이 행 수와 무관
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(sql, params)
+    except mysql.connector.Error:
+        conn.close()
+        raise
+    return conn, cursor
+
+def iter_chunks(conn, cursor, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield lists of rows from the cursor, closing the connection when done or abandoned."""
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield rows
+    finally:
+        # 중간에 연결이 끊겨도 닫으면 서버 쪽 쿼리도 정리됨
+        conn.close()
+
+def _record(row):
+    return (*row[:2], row[2].isoformat(), row[3], *map(bool, row[4:7]), row[7])
+
+def export_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(map(_record, rows))
+        yield buffer.getvalue()
+
+def export_ndjson(chunks):
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(COLUMNS, _record(row))), ensure_ascii=False) + "\n" for row in rows)
+
+class _ChunkSink:
+    """Write-only file that hands the written bytes back in pieces, tracking the absolute position."""
+
+    def __init__(self):
+        self.position = 0
+        self.closed = False
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def export_parquet(chunks):
+    """Write one Parquet row group per chunk and yield the bytes as they are produced."""
+    schema = pa.schema([
+        ("id", pa.int64()), ("cycle_id", pa.int32()), ("timestamp", pa.timestamp("s")), ("device_id", pa.string()),
+        ("fog", pa.bool_()), ("plasma", pa.bool_()), ("pump", pa.bool_()), ("description", pa.string()),
+    ])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            columns[4:7] = [[bool(value) for value in column] for column in columns[4:7]]
+            arrays = [pa.array(column, field.type) for column, field in zip(columns, schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+EXPORTERS = {"csv": export_csv, "ndjson": export_ndjson, "parquet": export_parquet}
+
+def export(start, end, device_ids=None, fmt="csv"):
+    """Start the history query now (so connection errors surface here) and stream it as CSV, NDJSON or Parquet."""
+    if fmt == "parquet" and pa is None:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+    conn, cursor = open_status_cursor(start, end, device_ids)
+    logging.info(f"Exporting power_status {start} - {end} as {fmt} for {', '.join(device_ids or ['all devices'])}")
+    return _stream(EXPORTERS[fmt], iter_chunks(conn, cursor))
+
+def _stream(exporter, chunks):
+    # 클라이언트가 중간에 끊으면 응답 제너레이터가 닫히므로 DB 연결도 바로 닫음
+    try:
+        yield from exporter(chunks)
+    finally:
+        chunks.close()
@@ -1,59 +1,135 @@
-import time
+import asyncio
 import logging
-import requests
-from config import BASE_URL, DEVICE_ID
-from auth import get_valid_token
-from database import initialize_db, save_to_db
-from utility import load_steps_from_csv, create_cycles_from_steps
-
-def cycle_control(steps, total_runtime=36000):
-    """Control the power strip based on cycles for a given runtime."""
-    token = get_valid_token()
-    if not token:
-        logging.error("Failed to obtain a valid token.")
+import os
+import signal
+from config import BASE_URL, DEVICE_IDS, JOURNAL_DIR, STORAGE_BACKENDS
+from auth import TokenManager
+from client import HeyHomeClient
+from database import initialize_db, BatchWriter
+from journal import JournalError, JournalWriter
+from engine import CycleEngine
+from events import EventPublisher
+from rollup import RollupJob
+import metrics
+from status_cache import StatusCache
+from utility import load_step_table
+
+# 감시 프로세스가 보내는 제어 신호 (기본 동작이 프로세스 종료이므로 시작부터 끝까지 처리기를 유지)
+CONTROL_SIGNALS = (signal.SIGUSR1, signal.SIGUSR2, signal.SIGHUP)
+# 엔진이 돌기 전/후에 받은 마지막 일시정지(True)/재개(False) 요청 (일시정지 중 재시작되면 감시 프로세스가 설정)
+_paused = os.getenv("HEYHOME_START_PAUSED") == "1"
+_reload = False  # steps.csv를 읽은 뒤 시작 중에 다시 로드 요청을 받았는지
+
+def remember_signal(signum, frame):
+    """Record pause/resume/reload requests that arrive while the engine is not running."""
+    global _paused, _reload
+    if signum == signal.SIGHUP:
+        _reload = True
+    else:
+        _paused = signum == signal.SIGUSR1
+
+def install_signal_handlers():
+    """Keep the control signals from killing the process outside the engine's event loop."""
+    for signum in CONTROL_SIGNALS:
+        signal.signal(signum, remember_signal)
+
+async def run_engine(engine, device_ids, signals=True):
+    """Run the engine with signal handlers for graceful stop and pause/resume (unless signals is False)."""
+    if not signals:
+        await engine.run(device_ids)
         return
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, engine.stop)
+    loop.add_signal_handler(signal.SIGINT, engine.stop)
+    loop.add_signal_handler(signal.SIGUSR1, engine.pause)
+    loop.add_signal_handler(signal.SIGUSR2, engine.resume)
+    loop.add_signal_handler(signal.SIGHUP, engine.request_reload)
+    # 시작 중에 받은 일시정지/다시 로드 요청은 엔진이 시작된 직후 적용
+    if _paused:
+        loop.call_soon(engine.pause)
+    if _reload:
+        loop.call_soon(engine.request_reload)
+    try:
+        await engine.run(device_ids)
+    finally:
+        # 이벤트 루프가 닫히면 처리기가 기본 동작으로 돌아가므로 종료 처리 중에도 다시 설치
+        for signum in CONTROL_SIGNALS:
+            loop.remove_signal_handler(signum)
+        install_signal_handlers()
+
+def cycle_control(steps, total_runtime=36000, device_ids=None, steps_file=None,
+                  client=None, writer=None, clock=None, executor=None):
+    """Control the power strips based on cycles for a given runtime.
 
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    cycles = create_cycles_from_steps(steps)
-
-    start_time = time.time()
-    cycle_id = 1
-
-    while time.time() - start_time < total_runtime:
-        for cycle in cycles:
-            for step in cycle:
-                try:
-                    logging.info(f"Executing: {step['description']} (Cycle {cycle_id})")
-                    response = requests.post(
-                        f"{BASE_URL}/control/{DEVICE_ID}",
-                        headers=headers,
-                        json={"requirments": step["states"]}
-                    )
-                    if response.status_code == 200:
-                        logging.info(f"Device updated: {step['states']}")
-                        save_to_db(DEVICE_ID, step["states"], step["description"], cycle_id)
-                    else:
-                        logging.error(f"Failed to update device: {response.status_code}, {response.text}")
-                except Exception as e:
-                    logging.error(f"Error during step execution: {e}")
-                time.sleep(step["duration"])
-            cycle_id += 1
-            if time.time() - start_time >= total_runtime:
-                break
+    client/writer/clock/executor can be injected to run against a fake transport (see simulation.py).
+    """
+    device_ids = device_ids or DEVICE_IDS
+    if not device_ids:
+        logging.error("No device configured. Set DEVICE_ID or DEVICE_IDS.")
+        return
+
+    tokens = None
+    if client is None:
+        client = HeyHomeClient(BASE_URL)
+        tokens = TokenManager(client)
+        if not tokens.get_token():
+            logging.error("Failed to obtain a valid token.")
+            return
+        # 토큰은 메모리에서 관리하고 만료 전에 백그라운드에서 갱신
+        client.token_provider = tokens
+        tokens.start()
+    simulated = tokens is None
+
+    # 저널을 쓰면 DB가 끊겨도 기록이 디스크에 남았다가 연결되면 저장됨
+    try:
+        writer = writer or (JournalWriter() if JOURNAL_DIR else BatchWriter()).start()
+    except JournalError as e:
+        logging.error(f"Cannot open the status journal: {e}")
+        if tokens:
+            tokens.stop()
+        client.close()
+        return
+    metrics_server = None if simulated else metrics.serve()
+    # 새로 저장된 행을 주기적으로 시간/일별 ON 시간에 반영
+    rollups = RollupJob().start() if not simulated and "mysql" in STORAGE_BACKENDS else None
+    logging.info(f"Controlling {len(device_ids)} device(s): {', '.join(device_ids)}")
+    try:
+        # 주입된 클라이언트로 실행할 때는 상태 캐시와 대시보드 이벤트를 쓰지 않음
+        engine = CycleEngine(steps, client, writer, total_runtime,
+                             status_cache=None if simulated else StatusCache(client),
+                             events=None if simulated else EventPublisher(),
+                             steps_file=steps_file, clock=clock, executor=executor)
+        # 시뮬레이션/테스트에서 실행될 때는 호출한 프로세스의 신호 처리기를 바꾸지 않음
+        asyncio.run(run_engine(engine, device_ids, signals=not simulated and clock is None))
+    finally:
+        # 종료 시 남은 DB 기록을 모두 저장
+        writer.stop()
+        if tokens:
+            tokens.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+        if rollups:
+            rollups.stop()
+            rollups.run_once()
+        logging.info(f"API latency stats: {client.stats()}")
+        client.close()
 
 def main():
     """Main execution entry point."""
+    # DB 마이그레이션/토큰 발급 중에 일시정지/다시 로드 신호를 받아도 종료되지 않도록 가장 먼저 설치
+    install_signal_handlers()
     STEPS_FILE = "steps.csv"
 
-    initialize_db()
-    steps = load_steps_from_csv(STEPS_FILE)
+    if "mysql" in STORAGE_BACKENDS:
+        initialize_db()
+    steps = load_step_table(STEPS_FILE).steps
 
     if not steps:
         logging.error("No steps found. Exiting.")
         return
 
     logging.info("Starting cycle control.")
-    cycle_control(steps)
+    cycle_control(steps, steps_file=STEPS_FILE)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,289 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from config import DB_BATCH_SIZE, DB_FLUSH_INTERVAL, JOURNAL_DIR, JOURNAL_SEGMENT_BYTES, JOURNAL_RETRY_MAX
+from database import BatchWriter, status_row
+from metrics import DB_BATCH_ROWS, DB_QUEUE_DEPTH
+
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_SUFFIX = ".ckpt"
+LOCK_FILE = "journal.lock"
+
+class JournalError(Exception):
+    """The journal directory cannot be used."""
+
+def encode_row(row):
+    """One status_row() tuple as a JSON line."""
+    cycle_id, timestamp, *rest = row
+    return (json.dumps([cycle_id, timestamp.isoformat(), *rest], ensure_ascii=False) + "\n").encode()
+
+def decode_row(line):
+    cycle_id, timestamp, *rest = json.loads(line)
+    return (cycle_id, datetime.fromisoformat(timestamp), *rest)
+
+class Journal:
+    """Append-only segment files of power_status rows with a per-segment checkpoint of each backend's offset."""
+
+    def __init__(self, directory=JOURNAL_DIR, segment_bytes=JOURNAL_SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        # 두 프로세스가 같은 디렉터리에 쓰면 세그먼트 번호가 겹치거나 쓰는 중인 세그먼트가 삭제되므로 막음
+        self._lock_file = open(os.path.join(directory, LOCK_FILE), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            self._lock_file.close()
+            raise JournalError(f"journal directory {directory} is in use by another process") from e
+        self._lock = threading.Lock()
+        self._checkpoints = {}
+        self._sealed = []  # 교체 후 아직 fsync하지 않은 세그먼트 파일
+        # 이전 실행의 마지막 세그먼트는 끝이 잘렸을 수 있으므로 이어 쓰지 않고 새 세그먼트에 기록
+        self.active = max(self.segments(), default=0) + 1
+        self._file = open(self._path(self.active, SEGMENT_SUFFIX), "ab")
+
+    def _path(self, segment, suffix):
+        return os.path.join(self.directory, f"{segment:012d}{suffix}")
+
+    def segments(self):
+        """Segment numbers on disk, oldest first."""
+        names = (name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        return sorted(int(name) for name in names if name.isdigit())
+
+    def append(self, row):
+        """Append one row; it is handed to the OS before returning, so a crash of this process cannot lose it."""
+        data = encode_row(row)
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            if self._file.tell() >= self.segment_bytes:
+                # fsync와 닫기는 replayer 스레드의 sync()에서 처리 (제어 루프에서 디스크 대기 없음)
+                self._sealed.append(self._file)
+                self.active += 1
+                self._file = open(self._path(self.active, SEGMENT_SUFFIX), "ab")
+
+    def sync(self):
+        """fsync the rolled and active segments (done periodically by the replayer rather than per row)."""
+        with self._lock:
+            if self._file.closed:
+                return
+            sealed, self._sealed = self._sealed, []
+            fd = os.dup(self._file.fileno())
+        # append()가 기다리지 않도록 잠금 밖에서 fsync
+        try:
+            for file in sealed:
+                os.fsync(file.fileno())
+                file.close()
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def read(self, segment, offset, limit):
+        """Up to limit complete rows starting at byte offset; returns (rows, offset after them)."""
+        rows = []
+        try:
+            with open(self._path(segment, SEGMENT_SUFFIX), "rb") as file:
+                file.seek(offset)
+                while len(rows) < limit:
+                    line = file.readline()
+                    if not line.endswith(b"\n"):
+                        break  # 아직 쓰는 중이거나 비정상 종료로 잘린 마지막 줄
+                    offset += len(line)
+                    try:
+                        rows.append(decode_row(line))
+                    except (ValueError, TypeError) as e:
+                        logging.error(f"Skipping corrupt journal record in segment {segment}: {e}")
+        except FileNotFoundError:
+            pass
+        return rows, offset
+
+    def count(self, segment, offset=0):
+        """Number of complete rows after byte offset."""
+        try:
+            with open(self._path(segment, SEGMENT_SUFFIX), "rb") as file:
+                file.seek(offset)
+                return sum(chunk.count(b"\n") for chunk in iter(lambda: file.read(1 << 20), b""))
+        except FileNotFoundError:
+            return 0
+
+    def checkpoint(self, segment):
+        """{backend name: byte offset already stored} for a segment."""
+        if segment not in self._checkpoints:
+            try:
+                with open(self._path(segment, CHECKPOINT_SUFFIX)) as file:
+                    self._checkpoints[segment] = json.load(file)
+            except FileNotFoundError:
+                self._checkpoints[segment] = {}
+            except ValueError as e:
+                # 체크포인트가 깨졌으면 처음부터 다시 저장 (중복은 생겨도 유실은 없음)
+                logging.error(f"Ignoring corrupt journal checkpoint for segment {segment}: {e}")
+                self._checkpoints[segment] = {}
+        return self._checkpoints[segment]
+
+    def save_checkpoint(self, segment, backend, offset):
+        offsets = self.checkpoint(segment)
+        offsets[backend] = offset
+        path = self._path(segment, CHECKPOINT_SUFFIX)
+        with open(path + ".tmp", "w") as file:
+            json.dump(offsets, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+
+    def release(self, segment):
+        """Delete a finished segment and its checkpoint (never the one being written)."""
+        if segment >= self.active:
+            return
+        for suffix in (SEGMENT_SUFFIX, CHECKPOINT_SUFFIX):
+            try:
+                os.remove(self._path(segment, suffix))
+            except FileNotFoundError:
+                pass
+        self._checkpoints.pop(segment, None)
+
+    def close(self):
+        with self._lock:
+            empty = self._file.tell() == 0
+            for file in [*self._sealed, self._file]:
+                os.fsync(file.fileno())
+                file.close()
+            self._sealed = []
+        if empty:
+            # 아무것도 기록하지 않은 실행은 빈 세그먼트를 남기지 않음
+            for suffix in (SEGMENT_SUFFIX, CHECKPOINT_SUFFIX):
+                try:
+                    os.remove(self._path(self.active, suffix))
+                except FileNotFoundError:
+                    pass
+        self._lock_file.close()
+
+class JournalWriter(BatchWriter):
+    """BatchWriter that appends every row to the local journal first and replays it into the backends.
+
+    A database outage or restart costs neither rows nor control-loop latency: a failing backend is retried
+    with backoff while the others keep up. Rows written just before a crash may be stored twice.
+    """
+
+    def __init__(self, journal=None, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL,
+                 retry_max=JOURNAL_RETRY_MAX, backends=None):
+        super().__init__(batch_size, flush_interval, max_queue=1, backends=backends)
+        self.journal = journal or Journal()
+        self.retry_max = retry_max
+        self._stopping = threading.Event()
+        self._positions = {}  # 저장소 이름 -> [세그먼트, 오프셋]
+        self._retry = {}  # 저장소 이름 -> (다음 시도 시각, 대기 시간)
+        self._backlog = {}  # 저장소별 이전 실행에서 남은 행 수
+        self._stored = {backend.name: 0 for backend in self.backends}
+        self._stats["journaled"] = 0
+
+    def start(self):
+        """Load each backend's checkpoint and start the background replayer."""
+        segments = self.journal.segments()
+        first = min(segments, default=self.journal.active)
+        for backend in self.backends:
+            self._seek(backend.name, first)
+            self._backlog[backend.name] = sum(
+                self.journal.count(segment, self.journal.checkpoint(segment).get(backend.name, 0))
+                for segment in range(first, self.journal.active)
+            )
+        if any(self._backlog.values()):
+            logging.info(f"Replaying {max(self._backlog.values())} journaled status record(s) from a previous run.")
+        unloaded = {name for segment in segments for name in self.journal.checkpoint(segment)} - set(self._positions)
+        if unloaded:
+            logging.warning(f"Keeping journal segments for storage backend(s) not loaded now: {', '.join(sorted(unloaded))}")
+        DB_QUEUE_DEPTH.set_function(self.pending)
+        self._thread.start()
+        return self
+
+    def submit(self, device_id, states, description, cycle_id, timestamp=None):
+        """Append the status record to the journal; the replayer stores it once the backends accept it."""
+        try:
+            self.journal.append(status_row(device_id, states, description, cycle_id, timestamp))
+            self._stats["journaled"] += 1
+        except OSError as e:
+            self._stats["dropped"] += 1
+            logging.error(f"Journal write failed, dropped record: {device_id}, {description}, Cycle: {cycle_id}: {e}")
+
+    def stop(self, timeout=None):
+        """Replay what the backends accept now and stop; anything left is replayed on the next start."""
+        if self._thread.is_alive():
+            self._stopping.set()
+            self._thread.join(timeout)
+        self.journal.close()
+        for backend in self.backends:
+            backend.close()
+        logging.info(f"DB writer stopped: {self.stats()}")
+
+    def pending(self):
+        """Rows in the journal the slowest backend has not stored yet."""
+        return max((self._backlog.get(name, 0) + self._stats["journaled"] - stored
+                    for name, stored in self._stored.items()), default=0)
+
+    def stats(self):
+        return {"queue_depth": self.pending(), **self._stats}
+
+    def _run(self):
+        while True:
+            stopping = self._stopping.wait(self.flush_interval)
+            self.journal.sync()
+            # 종료할 때는 대기 중인 저장소도 한 번 더 시도
+            for backend in self.backends:
+                self._replay(backend, force=stopping)
+            self._release()
+            if stopping:
+                return
+
+    def _seek(self, name, segment):
+        """Start a backend at a segment, naming it in the segment's checkpoint so the segment is kept for it."""
+        offsets = self.journal.checkpoint(segment)
+        if name not in offsets:
+            self.journal.save_checkpoint(segment, name, 0)
+        self._positions[name] = position = [segment, offsets[name]]
+        return position
+
+    def _release(self):
+        """Delete the oldest segments every backend named in their checkpoint has stored."""
+        if not self._positions:
+            return  # 저장소가 하나도 없으면 아무도 저장하지 않았으므로 지우지 않음
+        for segment in self.journal.segments():
+            names = set(self.journal.checkpoint(segment)) | set(self._positions)
+            # 지금 로드되지 않은 저장소가 남긴 세그먼트는 그 저장소가 다시 설정될 때까지 보관
+            if any(name not in self._positions or self._positions[name][0] <= segment for name in names):
+                break
+            self.journal.release(segment)
+
+    def _replay(self, backend, force=False):
+        retry_at, delay = self._retry.get(backend.name, (0.0, 0.0))
+        if time.monotonic() < retry_at and not force:
+            return
+        position = self._positions[backend.name]
+        while True:
+            segment, offset = position
+            # 읽기 전에 확인해야 읽는 사이 교체된 세그먼트의 마지막 행을 놓치지 않음
+            sealed = segment < self.journal.active
+            rows, end = self.journal.read(segment, offset, self.batch_size)
+            if rows:
+                start = time.monotonic()
+                DB_BATCH_ROWS.observe(len(rows))
+                if not self._write(backend, rows):
+                    # 실패한 저장소만 점점 길게 기다렸다가 같은 위치부터 다시 시도
+                    delay = min(self.retry_max, max(self.flush_interval, delay * 2))
+                    self._retry[backend.name] = (time.monotonic() + delay, delay)
+                    return
+                self._retry.pop(backend.name, None)
+                self._stored[backend.name] += len(rows)
+                self._stats["batches"] += 1
+                self._stats["last_flush_latency"] = latency = time.monotonic() - start
+                self._stats["max_flush_latency"] = max(self._stats["max_flush_latency"], latency)
+            if end > offset:
+                position[1] = end
+                self.journal.save_checkpoint(segment, backend.name, end)
+            elif sealed:
+                # 다 저장한 세그먼트는 더 이상 쓰이지 않으므로 다음 세그먼트로
+                position = self._seek(backend.name, segment + 1)
+            else:
+                return
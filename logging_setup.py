@@ -0,0 +1,115 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 로그 호출 시 extra={...}로 넘기면 JSON 레코드에 따로 기록되는 필드
+CONTEXT_FIELDS = ("device_id", "cycle_id", "step")
+
+_listener = None
+_queue_handler = None
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with device_id/cycle_id/step as separate fields when given."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """Rotate by size and/or age into numbered .gz backups (log_file.log.1.gz, ...)."""
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, rotate_seconds=0, encoding="utf-8"):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.rotate_seconds = rotate_seconds
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._compress
+        self._rollover_at = self._next_rollover()
+
+    def _next_rollover(self):
+        return time.time() + self.rotate_seconds if self.rotate_seconds else None
+
+    @staticmethod
+    def _compress(source, dest):
+        with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+    def shouldRollover(self, record):
+        # 다른 프로세스(대시보드/컨트롤러)가 이미 교체한 파일이면 다시 열기만 함
+        if self.stream and self._moved():
+            self.stream.close()
+            self.stream = self._open()
+            self._rollover_at = self._next_rollover()
+            return False
+        if self._rollover_at and time.time() >= self._rollover_at and self.backupCount:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def _moved(self):
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except OSError:
+            return True
+
+    def doRollover(self):
+        super().doRollover()
+        self._rollover_at = self._next_rollover()
+
+def setup_logging(filename, level=logging.INFO, json_format=False, max_bytes=0, backup_count=0, rotate_seconds=0):
+    """Send all log records through a queue to a background thread that writes the file."""
+    global _listener, _queue_handler
+    if _listener:
+        return _listener
+    handler = CompressingRotatingFileHandler(filename, max_bytes, backup_count, rotate_seconds)
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+
+    # 로그를 남기는 스레드는 큐에 넣기만 하고, 파일 쓰기/교체/압축은 listener 스레드가 처리
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    _queue_handler = QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+@contextmanager
+def without_log_file():
+    """Send records logged inside the block to stderr (warnings and up) instead of the log file."""
+    root = logging.getLogger()
+    if _queue_handler not in root.handlers:
+        yield
+        return
+    # 처리기가 하나도 없으면 logging.info()가 basicConfig()로 처리기를 추가하므로 대신 stderr 처리기를 둠
+    console = logging.StreamHandler()
+    console.setLevel(logging.WARNING)
+    console.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+    root.removeHandler(_queue_handler)
+    root.addHandler(console)
+    try:
+        yield
+    finally:
+        root.removeHandler(console)
+        root.addHandler(_queue_handler)
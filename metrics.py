@@ -0,0 +1,173 @@
+import logging
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_HOST, METRICS_PORT
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """One metric family with optional labels, rendered in the Prometheus text format."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        """Read the value from function() at render time (unlabelled gauges only)."""
+        self._function = function
+
+    def render(self):
+        if self._function:
+            try:
+                self.set(self._function())
+            except Exception as e:
+                logging.error(f"Error reading gauge {self.name}: {e}")
+        return super().render()
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # 버킷별 개수만 세고 렌더링할 때 누적값으로 바꿈
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _labels(self.label_names, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+REGISTRY = Registry()
+
+API_LATENCY = REGISTRY.register(Histogram(
+    "heyhome_api_request_seconds", "HeyHome API request latency.", ["endpoint", "status"]))
+STEP_LATENESS = REGISTRY.register(Histogram(
+    "heyhome_step_lateness_seconds", "Delay between a step's planned deadline and its execution.",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5, 30)))
+STEPS = REGISTRY.register(Counter(
+    "heyhome_steps_total", "Steps executed per device.", ["device_id", "result"]))
+DB_WRITE_LATENCY = REGISTRY.register(Histogram(
+    "heyhome_db_write_seconds", "Time to write one batch of power_status rows.", ["backend", "result"]))
+DB_BATCH_ROWS = REGISTRY.register(Histogram(
+    "heyhome_db_batch_rows", "Rows per power_status write.", buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)))
+DB_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "heyhome_db_queue_depth", "Rows waiting in the DB write queue."))
+TOKEN_REFRESHES = REGISTRY.register(Counter(
+    "heyhome_token_refresh_total", "Access token refresh attempts.", ["grant", "result"]))
+CONTROL_RETRIES = REGISTRY.register(Counter(
+    "heyhome_control_retries_total", "Control calls retried within a step."))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "heyhome_circuit_state", "HeyHome API circuit breaker state (0 closed, 1 half-open, 2 open).", ["endpoint"]))
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics on a side port in a background thread; port 0 disables it."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        # 포트가 사용 중이어도 제어는 계속되어야 하므로 로그만 남김
+        logging.error(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Metrics available on http://{host}:{port}/metrics")
+    return server
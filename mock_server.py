@@ -0,0 +1,228 @@
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from auth import AES256  # config를 거쳐 .env도 로드됨 (APP_KEY, CLIENT_ID, CLIENT_SECRET 기본값)
+
+# BASE_URL 경로 접두사와 상관없이 마지막 경로로 엔드포인트를 구분
+ROUTE = re.compile(r"/(token|control|device|devices)(?:/([^/?]+))?/?(?:\?.*)?$")
+
+class MockHeyHome:
+    """In-memory HeyHome Open API: token exchange, device list, device state and control."""
+
+    def __init__(self, devices=1000, app_key=None, client_id=None, client_secret=None, token_ttl=15552000,
+                 latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0.0, burst=None, seed=None):
+        self.app_key = app_key or os.getenv("APP_KEY") or "0" * 32
+        self.client_id = client_id or os.getenv("CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("CLIENT_SECRET")
+        self.token_ttl = token_ttl
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit  # 초당 허용 요청 수 (0이면 제한 없음)
+        self.burst = burst or max(1, rate_limit)
+        self.random = random.Random(seed)
+        self.devices = {
+            f"mock-{i:05d}": {
+                "id": f"mock-{i:05d}",
+                "name": f"Mock Power Strip {i}",
+                "deviceType": "PowerStrip",
+                "online": True,
+                "deviceState": {"power1": False, "power2": False, "power3": False},
+            }
+            for i in range(1, devices + 1)
+        }
+        self.tokens = {}          # access_token -> 만료 시각 (epoch)
+        self.refresh_tokens = set()
+        self.counters = {"requests": 0, "errors": 0, "throttled": 0, "unauthorized": 0, "controls": 0}
+        self._allowance = float(self.burst)
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _throttled(self):
+        # 토큰 버킷: rate_limit 속도로 채워지고 burst까지 쌓임
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        self._allowance = min(self.burst, self._allowance + (now - self._checked) * self.rate_limit)
+        self._checked = now
+        if self._allowance < 1:
+            return True
+        self._allowance -= 1
+        return False
+
+    def handle(self, method, path, headers, body):
+        """Return (status, payload, extra headers) for one request."""
+        with self._lock:
+            self.counters["requests"] += 1
+            throttled = self._throttled()
+            failed = not throttled and self.random.random() < self.error_rate
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            with self._lock:
+                self.counters["throttled"] += 1
+            return 429, {"message": "Too Many Requests"}, {"Retry-After": str(max(1, round(1 / self.rate_limit)))}
+        if failed:
+            with self._lock:
+                self.counters["errors"] += 1
+            return 500, {"message": "Simulated server error"}, {}
+
+        match = ROUTE.search(path)
+        if not match:
+            return 404, {"message": "Not Found"}, {}
+        endpoint, device_id = match.groups()
+        if endpoint == "token":
+            if method != "POST":
+                return 405, {"message": "Method Not Allowed"}, {}
+            status, payload = self.token(body)
+            return status, payload, {}
+        if not self.authorized(headers.get("Authorization", "")):
+            with self._lock:
+                self.counters["unauthorized"] += 1
+            return 401, {"message": "Invalid or expired access token"}, {}
+        if endpoint == "devices" and method == "GET":
+            with self._lock:
+                devices = [{k: v for k, v in d.items() if k != "deviceState"} for d in self.devices.values()]
+            return 200, devices, {}
+        device = self.devices.get(device_id)
+        if device is None:
+            return 404, {"message": f"Unknown device: {device_id}"}, {}
+        if endpoint == "device" and method == "GET":
+            with self._lock:
+                return 200, {**device, "deviceState": dict(device["deviceState"])}, {}
+        if endpoint == "control" and method == "POST":
+            states = (body or {}).get("requirments")
+            if not isinstance(states, dict) or any(port not in device["deviceState"] for port in states):
+                return 400, {"message": "Invalid requirments"}, {}
+            with self._lock:
+                device["deviceState"].update({port: bool(value) for port, value in states.items()})
+                self.counters["controls"] += 1
+            return 200, {"result": "success"}, {}
+        return 405, {"message": "Method Not Allowed"}, {}
+
+    def token(self, body):
+        """Decrypt the AES256 payload and issue a token for the password or refresh_token grant."""
+        try:
+            credentials = json.loads(AES256(self.app_key).decrypt((body or {})["data"]))
+        except Exception:
+            return 400, {"message": "Invalid encrypted data"}
+        if self.client_id and credentials.get("client_id") != self.client_id or \
+                self.client_secret and credentials.get("client_secret") != self.client_secret:
+            return 401, {"message": "Invalid client"}
+        grant_type = credentials.get("grant_type")
+        with self._lock:
+            if grant_type == "refresh_token":
+                # 처음 보는 refresh_token도 받아줌 (실제 서버에서 발급된 .env 값으로 바로 시작할 수 있게)
+                self.refresh_tokens.discard(credentials.get("refresh_token"))
+            elif grant_type != "password":
+                return 400, {"message": f"Unsupported grant_type: {grant_type}"}
+            access_token, refresh_token = str(uuid.uuid4()), str(uuid.uuid4())
+            self.tokens[access_token] = time.time() + self.token_ttl
+            self.refresh_tokens.add(refresh_token)
+        return 200, {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "refresh_token": refresh_token,
+            "expires_in": self.token_ttl,
+            "scope": "openapi",
+        }
+
+    def authorized(self, header):
+        token = header[len("Bearer "):] if header.startswith("Bearer ") else ""
+        expires_at = self.tokens.get(token)
+        return expires_at is not None and time.time() < expires_at
+
+    def issue_token(self):
+        """Issue an access token directly, skipping the encrypted exchange."""
+        with self._lock:
+            access_token = str(uuid.uuid4())
+            self.tokens[access_token] = time.time() + self.token_ttl
+        return access_token
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive 연결을 유지해 클라이언트 연결 풀을 그대로 사용
+    protocol_version = "HTTP/1.1"
+    # 헤더와 본문이 따로 전송되므로 Nagle 지연(~40ms)이 생기지 않게 끔
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            body = None
+        status, payload, headers = self.server.api.handle(self.command, self.path, self.headers, body)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, format, *args):
+        # 부하 테스트 중 요청마다 로그를 남기지 않음
+        pass
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, api, host="127.0.0.1", port=0):
+        super().__init__((host, port), MockRequestHandler)
+        self.api = api
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread and return self."""
+        threading.Thread(target=self.serve_forever, name="mock-heyhome", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock of the HeyHome Open API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--devices", type=int, default=1000, help="number of simulated devices")
+    parser.add_argument("--latency", type=float, default=0.0, help="added response latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests per second before 429 (0 = off)")
+    parser.add_argument("--burst", type=float, default=None, help="429 token bucket size")
+    parser.add_argument("--token-ttl", type=int, default=15552000, help="access token lifetime (s)")
+    args = parser.parse_args()
+
+    api = MockHeyHome(args.devices, token_ttl=args.token_ttl, latency=args.latency, jitter=args.jitter,
+                      error_rate=args.error_rate, rate_limit=args.rate_limit, burst=args.burst)
+    server = MockServer(api, args.host, args.port)
+    print(f"Mock HeyHome API on {server.url} with {args.devices} device(s) (mock-00001 ...)", flush=True)
+    logging.info(f"Mock HeyHome API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(api.counters), flush=True)
+
+if __name__ == "__main__":
+    main()
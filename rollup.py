@@ -0,0 +1,197 @@
+import argparse
+import json
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+import mysql.connector
+from config import ROLLUP_INTERVAL, ROLLUP_BATCH_SIZE, ROLLUP_MAX_GAP
+from database import PORT_COLUMNS, backfill_pending, connect_to_db, db_cursor, release_connection
+
+UPSERT_HOURLY_SQL = """
+    INSERT INTO duty_cycle_hourly (device_key, port, hour, on_seconds) VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE on_seconds = on_seconds + VALUES(on_seconds)
+"""
+UPSERT_DAILY_SQL = """
+    INSERT INTO duty_cycle_daily (device_key, port, day, on_seconds) VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE on_seconds = on_seconds + VALUES(on_seconds)
+"""
+UPSERT_STATE_SQL = """
+    INSERT INTO rollup_state (device_key, last_timestamp, fog, plasma, pump) VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE last_timestamp = VALUES(last_timestamp), fog = VALUES(fog),
+        plasma = VALUES(plasma), pump = VALUES(pump)
+"""
+
+def split_hours(start, end):
+    """Yield (hour start, seconds) for every clock hour touched by [start, end)."""
+    while start < end:
+        hour = start.replace(minute=0, second=0, microsecond=0)
+        boundary = min(end, hour + timedelta(hours=1))
+        yield hour, (boundary - start).total_seconds()
+        start = boundary
+
+def fold(rows, states, max_gap=ROLLUP_MAX_GAP):
+    """Turn status rows into on-time per (device, port, hour) and (device, port, day).
+
+    states maps device_key -> (timestamp, port states) of the last row seen and is updated in place.
+    """
+    hourly = defaultdict(float)
+    daily = defaultdict(float)
+    for device_key, timestamp, *ports in rows:
+        previous = states.get(device_key)
+        if previous and timestamp < previous[0]:
+            continue  # 늦게 도착한 과거 행은 이미 지난 구간이므로 무시
+        if previous:
+            # 직전 행의 상태가 이번 행까지 유지된 것으로 계산 (컨트롤러가 멈춘 긴 공백은 max_gap까지만)
+            last_timestamp, last_ports = previous
+            end = min(timestamp, last_timestamp + timedelta(seconds=max_gap))
+            for hour, seconds in split_hours(last_timestamp, end):
+                for port, on in enumerate(last_ports, start=1):
+                    if on:
+                        hourly[device_key, port, hour] += seconds
+                        daily[device_key, port, hour.date()] += seconds
+        states[device_key] = (timestamp, tuple(bool(p) for p in ports))
+    return hourly, daily
+
+class RollupJob:
+    """Fold new power_status rows into hourly and daily on-time rollups, never recomputing old data."""
+
+    def __init__(self, interval=ROLLUP_INTERVAL, batch_size=ROLLUP_BATCH_SIZE, max_gap=ROLLUP_MAX_GAP):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_gap = max_gap
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Process every row added since the last run; returns the number of rows folded in."""
+        conn = connect_to_db()
+        if not conn:
+            return 0
+        try:
+            cursor = conn.cursor(buffered=True)
+            # 여러 프로세스에서 실행해도 한 번에 하나만 진행
+            cursor.execute("SELECT GET_LOCK('heyhome_rollup', 0)")
+            if not cursor.fetchone()[0]:
+                return 0
+            try:
+                # 백필 전에 반영하면 워터마크가 옛 id를 지나쳐 복사된 행이 집계에서 빠짐
+                if backfill_pending(cursor):
+                    logging.info("Duty-cycle rollup waits for `python3 database.py backfill` to finish.")
+                    return 0
+                total = 0
+                while True:
+                    processed = self._step(cursor)
+                    conn.commit()
+                    total += processed
+                    if processed < self.batch_size:
+                        return total
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK('heyhome_rollup')")
+                cursor.fetchone()
+        except mysql.connector.Error as e:
+            logging.error(f"Duty-cycle rollup failed: {e}")
+            return 0
+        finally:
+            release_connection(conn)
+
+    def _step(self, cursor):
+        cursor.execute("SELECT last_id FROM rollup_watermark WHERE id = 1")
+        row = cursor.fetchone()
+        last_id = row[0] if row else 0
+        cursor.execute(
+            "SELECT id, device_key, timestamp, fog, plasma, pump FROM power_status WHERE id > %s ORDER BY id LIMIT %s",
+            (last_id, self.batch_size),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+
+        device_keys = sorted({row[1] for row in rows})
+        placeholders = ", ".join(["%s"] * len(device_keys))
+        cursor.execute(
+            f"SELECT device_key, last_timestamp, fog, plasma, pump FROM rollup_state WHERE device_key IN ({placeholders})",
+            device_keys,
+        )
+        states = {key: (timestamp, tuple(ports)) for key, timestamp, *ports in cursor.fetchall()}
+        hourly, daily = fold([row[1:] for row in rows], states, self.max_gap)
+
+        # 누적값에 더하기만 하므로 이전 구간을 다시 계산하지 않음 (워터마크와 같은 트랜잭션)
+        if hourly:
+            cursor.executemany(UPSERT_HOURLY_SQL, [(*key, round(seconds)) for key, seconds in hourly.items()])
+        if daily:
+            cursor.executemany(UPSERT_DAILY_SQL, [(*key, round(seconds)) for key, seconds in daily.items()])
+        cursor.executemany(UPSERT_STATE_SQL, [(key, states[key][0], *states[key][1]) for key in device_keys])
+        cursor.execute(
+            "INSERT INTO rollup_watermark (id, last_id) VALUES (1, %s) ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)",
+            (rows[-1][0],),
+        )
+        return len(rows)
+
+    def start(self):
+        """Run the job every interval seconds in a background thread."""
+        if self.interval and not self._thread:
+            self._thread = threading.Thread(target=self._run, name="rollup", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            processed = self.run_once()
+            if processed:
+                logging.info(f"Duty-cycle rollup folded in {processed} row(s).")
+
+def duty_cycle(start, end, device_ids=None, ports=None, resolution="day"):
+    """On-time per device, port and hour/day in [start, end) from the rollup tables."""
+    table, column = ("duty_cycle_hourly", "hour") if resolution == "hour" else ("duty_cycle_daily", "day")
+    if resolution != "hour":
+        # 끝 시각이 하루 중간이면 그날까지 포함
+        start, end = start.date(), (end - timedelta(microseconds=1)).date() + timedelta(days=1)
+    sql = f"""
+        SELECT d.device_id, r.port, r.{column}, r.on_seconds
+        FROM {table} r JOIN devices d ON d.id = r.device_key
+        WHERE r.{column} >= %s AND r.{column} < %s
+    """
+    params = [start, end]
+    if device_ids:
+        sql += f" AND d.device_id IN ({', '.join(['%s'] * len(device_ids))})"
+        params += device_ids
+    if ports:
+        sql += f" AND r.port IN ({', '.join(['%s'] * len(ports))})"
+        params += [PORT_COLUMNS.index(port) + 1 for port in ports]
+    sql += f" ORDER BY d.device_id, r.port, r.{column}"
+    period = 3600 if resolution == "hour" else 86400
+    with db_cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {
+                "device_id": device_id,
+                "port": PORT_COLUMNS[port - 1],
+                resolution: bucket.isoformat(),
+                "on_seconds": on_seconds,
+                "duty_cycle": round(on_seconds / period, 4),
+            }
+            for device_id, port, bucket, on_seconds in cursor.fetchall()
+        ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Update or query the duty-cycle rollups.")
+    parser.add_argument("command", choices=["update", "query"])
+    parser.add_argument("--days", type=int, default=7, help="query: how many days back")
+    parser.add_argument("--resolution", choices=["day", "hour"], default="day")
+    args = parser.parse_args()
+
+    if args.command == "update":
+        print(json.dumps({"rows": RollupJob().run_once()}))
+        return
+    end = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    print(json.dumps(duty_cycle(end - timedelta(days=args.days), end, resolution=args.resolution), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import json
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from utility import group_steps
+
+PORT_PREFIX = "power"
+
+def port_bit(port):
+    """Bit for a powerN port (power1 -> bit 0), stable across schedules."""
+    return 1 << (int(port[len(PORT_PREFIX):]) - 1)
+
+def states_to_mask(states):
+    """Convert {port: bool} into (ports mask, values mask)."""
+    ports = values = 0
+    for port, value in states.items():
+        bit = port_bit(port)
+        ports |= bit
+        if value:
+            values |= bit
+    return ports, values
+
+@lru_cache(maxsize=None)
+def mask_to_states(ports, values):
+    """Convert masks back into {port: bool}; the dict is shared, so do not modify it."""
+    states = {}
+    bit = 0
+    while ports >> bit:
+        if ports >> bit & 1:
+            states[f"{PORT_PREFIX}{bit + 1}"] = bool(values >> bit & 1)
+        bit += 1
+    return states
+
+@lru_cache(maxsize=None)
+def control_body(ports, values):
+    """Pre-encoded /control request body for the given ports."""
+    return json.dumps({"requirments": mask_to_states(ports, values & ports)}).encode()
+
+class CompiledSchedule:
+    """One period of the cycle schedule, flattened into arrays for the control loop."""
+
+    def __init__(self, cycles):
+        self.descriptions = []
+        self.states = []                # 단계별 상태 dict (DB 기록/이벤트용, 공유 객체)
+        self.offsets = array("d")       # 주기 시작 기준 단계 시작 시각 (초)
+        self.durations = array("d")
+        self.ports = array("H")         # 단계에서 지정하는 포트 비트마스크
+        self.values = array("H")        # 포트별 ON/OFF 비트마스크
+        self.cycle_index = array("H")   # 단계가 속한 사이클 순번
+        self.cycle_starts = array("I")  # 사이클별 첫 단계 위치
+        self.is_cycle_start = array("B")
+
+        offset = 0.0
+        for number, cycle in enumerate(cycles):
+            self.cycle_starts.append(len(self.offsets))
+            for position, step in enumerate(cycle):
+                ports, values = states_to_mask(step["states"])
+                self.descriptions.append(step["description"])
+                self.states.append(mask_to_states(ports, values))
+                self.offsets.append(offset)
+                self.durations.append(step["duration"])
+                self.ports.append(ports)
+                self.values.append(values)
+                self.cycle_index.append(number)
+                self.is_cycle_start.append(position == 0)
+                offset += step["duration"]
+        self.period = offset
+
+        # 전체 상태 요청과 직전 단계 대비 변경분 요청을 미리 JSON bytes로 인코딩
+        self.bodies = [control_body(p, v) for p, v in zip(self.ports, self.values)]
+        self.diff_masks = array("H")
+        self.diff_bodies = []
+        for i in range(len(self.offsets)):
+            previous = i - 1  # 첫 단계는 주기의 마지막 단계와 비교 (-1)
+            changed = self.ports[i] & ~(self.ports[previous] & ~(self.values[previous] ^ self.values[i]))
+            self.diff_masks.append(changed)
+            self.diff_bodies.append(control_body(changed, self.values[i]))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def cycle_count(self):
+        return len(self.cycle_starts)
+
+    def body_for(self, index, changed):
+        """Encoded request body that sets the changed ports of step index."""
+        if changed == self.ports[index]:
+            return self.bodies[index]
+        if changed == self.diff_masks[index]:
+            return self.diff_bodies[index]
+        return control_body(changed, self.values[index])
+
+    def index_at(self, elapsed):
+        """Index of the step active elapsed seconds after the period start (O(log n))."""
+        return bisect_right(self.offsets, elapsed % self.period) - 1
+
+    def state_at(self, elapsed):
+        """Describe the step a device should be in elapsed seconds into its schedule."""
+        index = self.index_at(elapsed)
+        position = elapsed % self.period
+        return {
+            "index": index,
+            "cycle": self.cycle_index[index] + 1,
+            "description": self.descriptions[index],
+            "states": self.states[index],
+            "remaining": self.offsets[index] + self.durations[index] - position,
+        }
+
+def compile_schedule(steps, patterns=None):
+    """Compile a step table into a CompiledSchedule."""
+    return CompiledSchedule(group_steps(steps, patterns))
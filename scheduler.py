@@ -0,0 +1,130 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta
+
+class MonotonicClock:
+    """Real clock: monotonic seconds for deadlines, local time for records."""
+
+    def now(self):
+        return time.monotonic()
+
+    def wall(self):
+        return datetime.now()
+
+    async def sleep_until(self, deadline):
+        delay = deadline - self.now()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def attach(self):
+        """Register a task that sleeps on this clock (only VirtualClock needs it)."""
+
+    def detach(self):
+        pass
+
+class VirtualClock:
+    """Simulated clock that jumps to the next deadline once every attached task is sleeping."""
+
+    def __init__(self, start=None):
+        self.start = start or datetime(2000, 1, 1)
+        self._now = 0.0
+        self._active = 0   # attach()된 작업 수
+        self._sleepers = []  # (deadline, 순번, future) 힙
+        self._counter = itertools.count()
+
+    def now(self):
+        return self._now
+
+    def wall(self):
+        return self.start + timedelta(seconds=self._now)
+
+    async def sleep_until(self, deadline):
+        if deadline <= self._now:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (deadline, next(self._counter), future)
+        heapq.heappush(self._sleepers, entry)
+        self._advance()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if entry in self._sleepers:
+                self._sleepers.remove(entry)
+                heapq.heapify(self._sleepers)
+            raise
+
+    def attach(self):
+        self._active += 1
+
+    def detach(self):
+        self._active -= 1
+        self._advance()
+
+    def _advance(self):
+        # 모든 작업이 잠들어 있을 때만 시간을 가장 가까운 deadline으로 옮김 (같은 시각은 등록 순서대로 깨움)
+        if not self._sleepers or len(self._sleepers) < self._active:
+            return
+        deadline = self._sleepers[0][0]
+        self._now = max(self._now, deadline)
+        while self._sleepers and self._sleepers[0][0] <= deadline:
+            future = heapq.heappop(self._sleepers)[2]
+            if not future.cancelled():
+                future.set_result(None)
+
+class JitterStats:
+    """Aggregate step lateness (seconds after the planned deadline)."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, lateness):
+        # 이벤트 루프 타이머는 해상도만큼 일찍 깨어날 수 있으므로 음수는 0으로 처리
+        lateness = max(0.0, lateness)
+        self.count += 1
+        self.total += lateness
+        self.max = max(self.max, lateness)
+        self.last = lateness
+
+    def summary(self):
+        return {
+            "steps": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "last": self.last,
+        }
+
+class DeadlineScheduler:
+    """Sleep until absolute step deadlines measured from the run start."""
+
+    def __init__(self, clock=None, jitter=None):
+        self.clock = clock or MonotonicClock()
+        self.jitter = jitter or JitterStats()
+        self.start = self.clock.now()
+        self.offset = 0.0  # 다음 단계의 시작 시각 (start 기준 초)
+
+    @property
+    def next_deadline(self):
+        return self.start + self.offset
+
+    async def wait(self):
+        """Sleep until the current step's deadline and return its lateness."""
+        deadline = self.next_deadline
+        await self.clock.sleep_until(deadline)
+        lateness = self.clock.now() - deadline
+        self.jitter.record(lateness)
+        return lateness
+
+    def shift(self, seconds):
+        """Push every remaining deadline back, e.g. by the time spent paused."""
+        self.start += seconds
+
+    def advance(self, duration):
+        """Move the deadline to the start of the next step."""
+        # 이전 단계의 실제 소요 시간과 무관하게 계획된 시각에서 누적하므로 오차가 쌓이지 않음
+        self.offset += duration
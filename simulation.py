@@ -0,0 +1,115 @@
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import Executor, Future
+from database import status_row
+from heyhome import cycle_control
+from logging_setup import without_log_file
+from scheduler import VirtualClock
+from utility import load_step_table
+
+class InlineExecutor(Executor):
+    """Run submitted calls immediately in the calling thread."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.text = json.dumps(self.payload)
+
+    def json(self):
+        return self.payload
+
+class FakeClient:
+    """Stand-in for HeyHomeClient that records control calls against the virtual clock.
+
+    fail_calls lists the 1-based numbers of the control calls to answer with 503 (to exercise retries).
+    """
+
+    def __init__(self, clock, fail_calls=()):
+        self.clock = clock
+        self.fail_calls = set(fail_calls)
+        self.calls = []    # (가상 시각, device_id, 요청 상태), 실패한 호출 포함
+        self.devices = {}  # device_id -> 현재 포트 상태
+
+    def control(self, device_id, states=None, body=None):
+        if body is not None:
+            states = json.loads(body)["requirments"]
+        self.calls.append((self.clock.now(), device_id, dict(states)))
+        if len(self.calls) in self.fail_calls:
+            return FakeResponse(503, {"message": "Service Unavailable"})
+        self.devices.setdefault(device_id, {}).update(states)
+        return FakeResponse()
+
+    def device(self, device_id):
+        return FakeResponse(payload={"id": device_id, "deviceState": self.devices.get(device_id, {})})
+
+    def stats(self):
+        return {"control": {"count": len(self.calls)}}
+
+    def close(self):
+        pass
+
+class RecordingWriter:
+    """Stand-in for BatchWriter that keeps the power_status rows in memory."""
+
+    def __init__(self):
+        self.rows = []
+
+    def submit(self, device_id, states, description, cycle_id, timestamp=None):
+        self.rows.append(status_row(device_id, states, description, cycle_id, timestamp))
+
+    def stop(self, timeout=None):
+        pass
+
+    def stats(self):
+        return {"written": len(self.rows)}
+
+def simulate(steps, total_runtime=36000, device_ids=("sim-1",), client=None, steps_file=None):
+    """Run cycle_control on a virtual clock; returns the fake client and writer with everything recorded.
+
+    A client built on the same clock can be passed to inject failures; with steps_file the file is watched
+    for changes on the virtual clock like a real run.
+    """
+    clock = client.clock if client else VirtualClock()
+    client = client or FakeClient(clock)
+    writer = RecordingWriter()
+    # 가상 실행 기록이 운영 로그(LOG_FILE)에 섞이지 않도록 함
+    with without_log_file():
+        cycle_control(steps, total_runtime, list(device_ids), steps_file=steps_file, client=client, writer=writer,
+                      clock=clock, executor=InlineExecutor())
+    return client, writer
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the step schedule on a virtual clock.")
+    parser.add_argument("--steps", default="steps.csv")
+    parser.add_argument("--runtime", type=float, default=36000, help="simulated runtime in seconds")
+    parser.add_argument("--devices", type=int, default=1, help="number of simulated devices")
+    args = parser.parse_args()
+
+    with without_log_file():
+        steps = load_step_table(args.steps).steps
+        if not steps:
+            logging.error("No steps found. Exiting.")
+            return
+        started = time.perf_counter()
+        client, writer = simulate(steps, args.runtime, [f"sim-{i + 1}" for i in range(args.devices)])
+    print(json.dumps({
+        "simulated_seconds": args.runtime,
+        "devices": args.devices,
+        "control_calls": len(client.calls),
+        "rows": len(writer.rows),
+        "elapsed": round(time.perf_counter() - started, 3),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
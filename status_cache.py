@@ -0,0 +1,104 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import STATUS_CACHE_TTL, CONTROL_WORKERS
+
+# 포트 키만 골라냄 (단일 플러그의 "power", "powerOnState" 같은 키는 제외)
+PORT_KEY = re.compile(r"power[1-9]\d*")
+
+def port_states(status):
+    """Extract the powerN port states from a /device/{id} response."""
+    if not status:
+        return {}
+    state = status.get("deviceState", status)
+    return {key: bool(value) for key, value in state.items() if PORT_KEY.fullmatch(key)}
+
+class StatusCache:
+    """Cache /device/{id} responses for a TTL and share in-flight fetches between readers."""
+
+    def __init__(self, client, ttl=STATUS_CACHE_TTL, max_workers=CONTROL_WORKERS):
+        self.client = client
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._entries = {}   # device_id -> (가져온 시각, 상태)
+        self._inflight = {}  # device_id -> 진행 중인 조회의 Future
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "fetches": 0, "coalesced": 0, "errors": 0}
+
+    def get(self, device_id, max_age=None):
+        """Return the device status, fetching it only if the cached copy is older than max_age."""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry and time.monotonic() - entry[0] < max_age:
+                self.counters["hits"] += 1
+                return entry[1]
+            future = self._inflight.get(device_id)
+            owner = future is None
+            if owner:
+                future = self._inflight[device_id] = Future()
+            else:
+                # 같은 장치를 이미 조회 중이면 그 결과를 함께 기다림
+                self.counters["coalesced"] += 1
+
+        if owner:
+            try:
+                future.set_result(self._fetch(device_id, entry))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight.pop(device_id, None)
+        return future.result()
+
+    def _fetch(self, device_id, stale_entry):
+        self.counters["fetches"] += 1
+        try:
+            response = self.client.device(device_id)
+            if response.status_code == 200:
+                status = response.json()
+                with self._lock:
+                    self._entries[device_id] = (time.monotonic(), status)
+                return status
+            logging.error(f"[{device_id}] Failed to fetch status: {response.status_code}, {response.text}")
+        except Exception as e:
+            logging.error(f"[{device_id}] Error fetching status: {e}")
+        self.counters["errors"] += 1
+        # 조회에 실패하면 오래된 값이라도 돌려줌
+        return stale_entry[1] if stale_entry else None
+
+    def get_many(self, device_ids, max_age=None):
+        """Return statuses for many devices, fetching stale ones concurrently."""
+        if not device_ids:
+            return {}
+        workers = min(self.max_workers, len(device_ids))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="status") as executor:
+            statuses = executor.map(lambda device_id: self.get(device_id, max_age), device_ids)
+            return dict(zip(device_ids, statuses))
+
+    def refresh_all(self, device_ids):
+        """Fetch fresh statuses for all given devices."""
+        return self.get_many(device_ids, max_age=0)
+
+    def update(self, device_id, states):
+        """Merge port states confirmed by a control call into the cached status."""
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if not entry:
+                return
+            status = dict(entry[1])
+            if isinstance(status.get("deviceState"), dict):
+                status["deviceState"] = {**status["deviceState"], **states}
+            else:
+                status.update(states)
+            self._entries[device_id] = (entry[0], status)
+
+    def invalidate(self, device_id=None):
+        """Drop one cached status, or all of them."""
+        with self._lock:
+            if device_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(device_id, None)
@@ -0,0 +1,220 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from config import CONTROL_SOCKET, SUPERVISOR_MAX_BACKOFF, SUPERVISOR_STOP_TIMEOUT
+
+CONTROLLER_COMMAND = [sys.executable, "-u", "heyhome.py"]
+
+class Supervisor:
+    """Run heyhome.py as a child process, drain its output and restart it when it crashes."""
+
+    def __init__(self, command=None, max_backoff=SUPERVISOR_MAX_BACKOFF, stop_timeout=SUPERVISOR_STOP_TIMEOUT):
+        self.command = command or CONTROLLER_COMMAND
+        self.max_backoff = max_backoff
+        self.stop_timeout = stop_timeout
+        self.process = None
+        self.paused = False
+        self.restarts = 0
+        self.last_exit_code = None
+        self.started_at = None
+        self._wanted = False  # 사용자가 실행을 원하는 상태인지 (크래시 후 재시작 여부)
+        self._lock = threading.RLock()
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Start the controller; returns False if it is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._wanted = True
+            self.paused = False
+            self._spawn()
+            threading.Thread(target=self._monitor, name="supervisor", daemon=True).start()
+            return True
+
+    def _spawn(self):
+        # 일시정지 중에 크래시 후 재시작되면 새 프로세스도 일시정지 상태로 시작
+        env = {**os.environ, "HEYHOME_START_PAUSED": "1" if self.paused else "0"}
+        self.process = subprocess.Popen(
+            self.command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env=env,
+        )
+        self.started_at = time.monotonic()
+        logging.info(f"Controller started (pid {self.process.pid}).")
+        # 파이프 버퍼가 차서 자식이 멈추지 않도록 출력을 계속 읽어 로그로 보냄
+        for pipe, level in ((self.process.stdout, logging.INFO), (self.process.stderr, logging.WARNING)):
+            threading.Thread(target=self._drain, args=(pipe, level, self.process.pid), daemon=True).start()
+
+    @staticmethod
+    def _drain(pipe, level, pid):
+        with pipe:
+            for line in pipe:
+                logging.log(level, f"[heyhome {pid}] {line.rstrip()}")
+
+    def _monitor(self):
+        backoff = 1
+        while True:
+            process = self.process
+            code = process.wait()
+            with self._lock:
+                self.last_exit_code = code
+                if process is not self.process or not self._wanted:
+                    return
+                if code == 0:
+                    logging.info("Controller finished its runtime.")
+                    self._wanted = False
+                    return
+                # 오래 실행된 뒤의 크래시면 대기 시간을 처음부터 다시 늘림
+                if time.monotonic() - self.started_at > 60:
+                    backoff = 1
+                logging.error(f"Controller exited with code {code}, restarting in {backoff}s.")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+            with self._lock:
+                if not self._wanted or self.running:
+                    return
+                self.restarts += 1
+                self._spawn()
+
+    def stop(self):
+        """Ask the controller to shut down gracefully, killing it after stop_timeout.
+
+        Also cancels a restart pending after a crash; returns False if there was nothing to stop.
+        """
+        with self._lock:
+            wanted, self._wanted = self._wanted, False
+            if not self.running:
+                if wanted:
+                    logging.info("Cancelled the pending controller restart.")
+                return wanted
+            process = self.process
+            # SIGTERM을 받으면 컨트롤러는 남은 DB 기록을 저장한 뒤 종료
+            process.terminate()
+        try:
+            process.wait(self.stop_timeout)
+        except subprocess.TimeoutExpired:
+            logging.error(f"Controller did not stop within {self.stop_timeout}s, killing it.")
+            process.kill()
+            process.wait()
+        logging.info(f"Controller stopped (exit code {process.returncode}).")
+        return True
+
+    def pause(self):
+        """Hold every device at its current step until resume()."""
+        with self._lock:
+            if not self.running or self.paused:
+                return False
+            self.process.send_signal(signal.SIGUSR1)
+            self.paused = True
+            return True
+
+    def resume(self):
+        with self._lock:
+            if not self.running or not self.paused:
+                return False
+            self.process.send_signal(signal.SIGUSR2)
+            self.paused = False
+            return True
+
+    def reload(self):
+        """Ask the controller to re-read steps.csv at the next cycle boundary."""
+        with self._lock:
+            if not self.running:
+                return False
+            self.process.send_signal(signal.SIGHUP)
+            return True
+
+    def status(self):
+        with self._lock:
+            running = self.running
+            return {
+                "running": running,
+                "paused": running and self.paused,
+                "pid": self.process.pid if running else None,
+                "uptime": round(time.monotonic() - self.started_at, 1) if running else None,
+                "restarts": self.restarts,
+                "last_exit_code": self.last_exit_code,
+            }
+
+    def handle(self, command):
+        """Run one control command and return a JSON-serialisable reply."""
+        actions = {"start": self.start, "stop": self.stop, "pause": self.pause, "resume": self.resume,
+                   "reload": self.reload}
+        if command in actions:
+            return {"ok": actions[command](), **self.status()}
+        if command == "status":
+            return {"ok": True, **self.status()}
+        return {"ok": False, "error": f"unknown command: {command}"}
+
+    def serve(self, path=CONTROL_SOCKET):
+        """Accept line-based commands on a local Unix socket in a background thread."""
+        if os.path.exists(path):
+            os.unlink(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        os.chmod(path, 0o600)
+        server.listen()
+        threading.Thread(target=self._accept, args=(server,), name="supervisor-control", daemon=True).start()
+        logging.info(f"Supervisor control socket listening on {path}")
+        return server
+
+    def _accept(self, server):
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def _serve_client(self, conn):
+        with conn, conn.makefile("rw") as stream:
+            for line in stream:
+                try:
+                    reply = self.handle(line.strip().lower())
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                stream.write(json.dumps(reply) + "\n")
+                stream.flush()
+
+def send_command(command, path=CONTROL_SOCKET):
+    """Send a command to a running supervisor and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        with sock.makefile("rw") as stream:
+            stream.write(command + "\n")
+            stream.flush()
+            return json.loads(stream.readline())
+
+def main():
+    parser = argparse.ArgumentParser(description="Supervise heyhome.py and control it over a Unix socket.")
+    parser.add_argument("command", choices=["serve", "start", "stop", "status", "pause", "resume", "reload"])
+    args = parser.parse_args()
+
+    if args.command != "serve":
+        print(json.dumps(send_command(args.command), indent=2))
+        return
+
+    supervisor = Supervisor()
+    supervisor.serve()
+    supervisor.start()
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    supervisor.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
-import requests
 from dotenv import load_dotenv
 import os
+import sys
+
+# 상위 폴더의 공용 모듈 사용
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from client import HeyHomeClient
 
 # .env 파일 로드
 load_dotenv()
@@ -19,11 +23,10 @@ def get_device_list():
         print("Error: ACCESS_TOKEN not set in .env.")
         return None
 
-    device_url = f"{BASE_URL}/devices"
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
+    client = HeyHomeClient(BASE_URL, ACCESS_TOKEN)
 
     # API 호출
-    response = requests.get(device_url, headers=headers)
+    response = client.devices()
 
     if response.status_code == 200:
         devices = response.json()
@@ -1,7 +1,11 @@
-import requests
 import json
 from dotenv import load_dotenv
 import os
+import sys
+
+# 상위 폴더의 공용 모듈 사용
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from client import HeyHomeClient
 
 # .env 파일 로드
 load_dotenv()
@@ -17,11 +21,10 @@ def get_device_status(access_token, base_url, device_id):
         print("Error: Required environment variables are missing. Please check .env file.")
         return None
 
-    status_url = f"{base_url}/device/{device_id}"
-    headers = {"Authorization": f"Bearer {access_token}"}
+    client = HeyHomeClient(base_url, access_token)
 
     print(f"Fetching status for device {device_id}...")
-    response = requests.get(status_url, headers=headers)
+    response = client.device(device_id)
 
     if response.status_code == 200:
         status = response.json()
@@ -1,9 +1,9 @@
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 import base64
-import requests
 import json
 import os
+import sys
 import logging
 from datetime import datetime, timedelta
 from dotenv import load_dotenv, set_key
@@ -11,6 +11,10 @@ import mysql.connector
 import csv
 import time
 
+# 상위 폴더의 공용 모듈 사용
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from client import HeyHomeClient
+
 # .env 파일 로드
 load_dotenv()
 
@@ -92,9 +96,8 @@ def get_auth_token():
             return None
 
     encrypted_data = aes256.encrypt(json.dumps(json_data))
-    token_url = f"{BASE_URL}/token"
 
-    response = requests.post(token_url, json={"data": encrypted_data})
+    response = HeyHomeClient(BASE_URL).token(encrypted_data)
 
     if response.status_code == 200:
         token_data = response.json()
@@ -247,10 +250,7 @@ def cycle_control(steps, total_runtime=36000):
         logging.info("Failed to obtain a valid token.")
         return
 
-    headers = {
-        "Authorization": f"Bearer {token_data['access_token']}",
-        "Content-Type": "application/json",
-    }
+    client = HeyHomeClient(BASE_URL, token_data["access_token"])
 
     cycles = create_cycles_from_steps(steps)
     start_time = time.time()
@@ -260,15 +260,10 @@ def cycle_control(steps, total_runtime=36000):
             for step in cycle:
                 try:
                     print(f"Executing: {step['description']} (Cycle {cycle_id})")
-                    print(f"HEADERS: {headers}")
-                    print(f"requirements: {step["states"]}")
+                    print(f"requirements: {step['states']}")
                     print(f"{BASE_URL}/control/{DEVICE_ID}")
                     logging.info(f"Executing: {step['description']} (Cycle {cycle_id})")
-                    response = requests.post(
-                        f"{BASE_URL}/control/{DEVICE_ID}",
-                        headers=headers,
-                        json={"requirments": step["states"]}
-                    )
+                    response = client.control(DEVICE_ID, step["states"])
                     if response.status_code == 200:
                         print(f"Device updated: {step['states']}")
                         logging.info(f"Device updated: {step['states']}")
@@ -0,0 +1,85 @@
+import os
+import shutil
+from datetime import datetime, timedelta
+import pytest
+from config import CONTROL_RETRY_BASE
+from logging_setup import without_log_file
+from scheduler import VirtualClock
+from simulation import FakeClient, simulate
+from utility import load_step_table
+
+STEPS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "steps.csv")
+START = datetime(2000, 1, 1)
+
+ON, OFF = True, False
+SHIPPED_CALLS = [
+    (0.0, {"power1": ON, "power2": OFF, "power3": ON}),
+    (30.0, {"power1": OFF}),
+    (60.0, {"power2": ON}),
+    (90.0, {"power2": OFF}),
+    (120.0, {"power1": ON, "power2": ON}),
+    (150.0, {"power1": OFF, "power2": OFF}),
+]
+SHIPPED_ROWS = [
+    (1, 0, ON, OFF, ON, "Turning ON fog"),
+    (1, 30, OFF, OFF, ON, "Turning OFF fog"),
+    (2, 60, OFF, ON, ON, "Turning ON plasma"),
+    (2, 90, OFF, OFF, ON, "Turning OFF plasma"),
+    (3, 120, ON, ON, ON, "Turning ON fog and plasma"),
+    (3, 150, OFF, OFF, ON, "Turning OFF fog and plasma"),
+]
+HOLD_STEPS = (
+    "description,power1,power2,power3,duration,cycle\n"
+    "Hold,False,False,True,30,1\n"
+    "Hold again,False,False,True,30,1\n"
+)
+
+@pytest.fixture(autouse=True)
+def no_log_file():
+    # 테스트 실행 기록이 운영 로그에 남지 않도록 함
+    with without_log_file():
+        yield
+
+def expected_rows(rows, device_id="sim-1"):
+    return [(cycle, START + timedelta(seconds=at), device_id, *ports, description)
+            for cycle, at, *ports, description in rows]
+
+def test_shipped_schedule():
+    client, writer = simulate(load_step_table(STEPS_FILE).steps, 180)
+
+    assert [(at, device_id, states) for at, device_id, states in client.calls] == \
+        [(at, "sim-1", states) for at, states in SHIPPED_CALLS]
+    assert writer.rows == expected_rows(SHIPPED_ROWS)
+
+class ReloadingClient(FakeClient):
+    """Rewrite the steps file during the third cycle, as a save from /edit would."""
+
+    def __init__(self, clock, steps_file, **kwargs):
+        super().__init__(clock, **kwargs)
+        self.steps_file = steps_file
+        self.rewritten = False
+
+    def control(self, device_id, states=None, body=None):
+        if self.clock.now() >= 120 and not self.rewritten:
+            self.rewritten = True
+            with open(self.steps_file, "w") as file:
+                file.write(HOLD_STEPS)
+        return super().control(device_id, states, body)
+
+def test_retry_reload_and_skip(tmp_path):
+    steps_file = str(tmp_path / "steps.csv")
+    shutil.copy(STEPS_FILE, steps_file)
+    # 두 번째 호출은 503: 같은 단계 안에서 backoff 후 다시 보냄
+    client = ReloadingClient(VirtualClock(), steps_file, fail_calls=[2])
+
+    client, writer = simulate(load_step_table(steps_file).steps, 240, client=client, steps_file=steps_file)
+
+    retry_at = client.calls[2][0]
+    assert 30 + CONTROL_RETRY_BASE / 2 <= retry_at <= 30 + CONTROL_RETRY_BASE
+    calls = [(at, states) for at, _, states in client.calls]
+    assert calls == SHIPPED_CALLS[:2] + [(retry_at, {"power1": OFF})] + SHIPPED_CALLS[2:]
+
+    # 바뀐 단계는 다음 사이클 경계(180초)부터 적용되고, 상태가 같아 제어 호출 없이 기록만 남음
+    rows = [(1, retry_at, *row[2:]) if row[1] == 30 else row for row in SHIPPED_ROWS]
+    rows += [(4, 180, OFF, OFF, ON, "Hold"), (4, 210, OFF, OFF, ON, "Hold again")]
+    assert writer.rows == expected_rows(rows)
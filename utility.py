@@ -1,43 +1,115 @@
 import csv
 import logging
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
 
-def load_steps_from_csv(filename):
-    """Load steps from a CSV file."""
+# steps.csv에 cycle 열이 없을 때 사용하는 기본 사이클 패턴 (단계 설명 기준)
+DEFAULT_CYCLE_PATTERNS = [
+    ["Turning ON fog", "Turning OFF fog"],
+    ["Turning ON plasma", "Turning OFF plasma"],
+    ["Turning ON fog and plasma", "Turning OFF fog and plasma"],
+]
+
+# 파싱된 단계 표와 파일 버전 정보 (etag는 따옴표 없는 값)
+StepTable = namedtuple("StepTable", ["steps", "last_modified", "etag"])
+
+_step_tables = {}  # 파일 경로 -> ((mtime_ns, size), StepTable)
+_step_tables_lock = threading.Lock()
+
+def parse_bool(value):
+    """Parse a True/False cell from the steps file."""
+    text = (value or "").strip().lower()
+    if text not in ("true", "false"):
+        raise ValueError(f"expected True or False, got {value!r}")
+    return text == "true"
+
+def parse_steps(rows):
+    """Validate steps.csv rows (dicts of cell strings) into steps; raises ValueError naming the bad line."""
     steps = []
+    for line, row in enumerate(rows, start=2):
+        try:
+            description = (row["description"] or "").strip()
+            duration = int(row["duration"])
+            if not description or duration < 0:
+                raise ValueError("description is required and duration must be >= 0")
+            step = {
+                "description": description,
+                "states": {
+                    "power1": parse_bool(row["power1"]),
+                    "power2": parse_bool(row["power2"]),
+                    "power3": parse_bool(row["power3"]),
+                },
+                "duration": duration,
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"line {line}: {e}") from e
+        # 선택 열: 같은 cycle 값을 가진 단계끼리 하나의 사이클을 구성
+        if (row.get("cycle") or "").strip():
+            step["cycle"] = row["cycle"].strip()
+        steps.append(step)
+    # cycle 열은 모두 채우거나 모두 비워야 함 (일부만 있으면 설명 패턴으로 묶여 단계가 사라짐)
+    missing = [line for line, step in enumerate(steps, start=2) if "cycle" not in step]
+    if missing and len(missing) < len(steps):
+        raise ValueError(f"line(s) {', '.join(map(str, missing))}: cycle is empty but other rows set it")
+    return steps
+
+def read_step_rows(filename):
+    """Raw rows of a steps file, unvalidated (so an invalid file can still be shown and fixed)."""
+    with open(filename, "r", newline="") as file:
+        return list(csv.DictReader(file))
+
+def load_steps_from_csv(filename):
+    """Load and validate steps from a CSV file; an invalid file yields no steps."""
     try:
-        with open(filename, "r") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                steps.append({
-                    "description": row["description"],
-                    "states": {
-                        "power1": row["power1"].strip().lower() == "true",
-                        "power2": row["power2"].strip().lower() == "true",
-                        "power3": row["power3"].strip().lower() == "true",
-                    },
-                    "duration": int(row["duration"]),
-                })
+        steps = parse_steps(read_step_rows(filename))
         logging.info(f"Steps loaded successfully from {filename}")
     except Exception as e:
         logging.error(f"Error reading CSV file {filename}: {e}")
+        return []
     return steps
 
-def create_cycles_from_steps(steps):
-    """Create repeating cycles based on predefined patterns."""
-    cycle_patterns = [
-        ["Turning ON fog", "Turning OFF fog"],
-        ["Turning ON plasma", "Turning OFF plasma"],
-        ["Turning ON fog and plasma", "Turning OFF fog and plasma"],
-    ]
-
-    cycles = []
-    pattern_index = 0
+def load_step_table(filename):
+    """Return the parsed steps of a file, re-reading it only when its mtime or size changes."""
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return StepTable([], None, "missing")
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _step_tables_lock:
+        cached = _step_tables.get(filename)
+        if cached and cached[0] == version:
+            return cached[1]
+        table = StepTable(
+            load_steps_from_csv(filename),
+            datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+            f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+        )
+        _step_tables[filename] = (version, table)
+        return table
 
-    while len(cycles) < 1000:  # Limit cycle creation to prevent infinite loops
-        current_pattern = cycle_patterns[pattern_index]
-        current_cycle = [step for step in steps if step["description"] in current_pattern]
-        cycles.append(current_cycle)
-        pattern_index = (pattern_index + 1) % len(cycle_patterns)
+def group_steps(steps, patterns=None):
+    """Group steps into cycles, by their cycle column or by description patterns."""
+    missing = [step["description"] for step in steps if "cycle" not in step]
+    if missing and len(missing) < len(steps):
+        logging.warning(f"Steps without a cycle, grouping all steps by description pattern instead: {missing}")
+    if not missing:
+        # cycle 열이 있으면 처음 등장한 순서대로 묶음
+        groups = {}
+        for step in steps:
+            groups.setdefault(step["cycle"], []).append(step)
+        cycles = list(groups.values())
+    else:
+        # 설명 -> 단계 위치 인덱스를 한 번만 만들고 패턴별로 조회
+        index = {}
+        for i, step in enumerate(steps):
+            index.setdefault(step["description"], []).append(i)
+        cycles = []
+        for pattern in patterns or DEFAULT_CYCLE_PATTERNS:
+            positions = sorted(i for description in set(pattern) for i in index.get(description, []))
+            cycles.append([steps[i] for i in positions])
 
-    logging.info("Cycles created successfully.")
+    cycles = [cycle for cycle in cycles if cycle]
+    logging.info(f"Cycles created successfully: {len(cycles)} pattern(s).")
     return cycles